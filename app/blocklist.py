@@ -0,0 +1,111 @@
+"""Host blocklist compiled into a reversed-label trie.
+
+Rules come from ``BLOCKLIST_PATH`` (default: the bundled ``blocklist.txt``;
+see its header for the syntax). Checking a host walks its labels from the
+TLD inwards, so the cost depends on the host's depth, not on the number
+of rules. ``name.*`` rules match the host's registrable label, found with
+the public suffix list.
+"""
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import tldextract
+
+BLOCKLIST_PATH = os.getenv(
+    "BLOCKLIST_PATH", os.path.join(os.path.dirname(__file__), "blocklist.txt")
+)
+
+# Markers stored in trie nodes next to the child labels; labels never start with '$'
+_DOMAIN = "$domain"  # this host and everything below it
+_SUB = "$sub"        # strictly below this host
+_EXACT = "$exact"    # this host only
+
+# Public suffix list from the snapshot bundled with tldextract: the default
+# extractor downloads it on first use, which stalls without network access.
+_extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+def _registrable_label(labels: List[str]) -> Optional[str]:
+    # "www.example.co.uk" -> "example"; unknown suffixes count as one label
+    ext = _extract(".".join(labels))
+    if ext.suffix:
+        return ext.domain or None
+    return labels[-2] if len(labels) > 1 else None
+
+
+class Blocklist:
+    def __init__(self, rules: Iterable[str] = (), source: str = "<inline>") -> None:
+        self.source = source
+        self._root: Dict = {}
+        self._any_suffix: Dict[str, str] = {}  # "name.*" rules: name -> rule
+        self._rules: List[str] = []
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule: str) -> None:
+        """Add one rule; comments and blank lines are ignored."""
+        text = rule.split("#", 1)[0].strip().lower()
+        if not text:
+            return
+        if text.endswith(".*"):
+            name = text[:-2]
+            if not name or "." in name:
+                raise ValueError(f"invalid blocklist rule {rule!r} in {self.source}")
+            self._any_suffix[name] = text
+            self._rules.append(text)
+            return
+        if text.startswith("*."):
+            kind, host = _SUB, text[2:]
+        elif text.startswith("="):
+            kind, host = _EXACT, text[1:]
+        else:
+            kind, host = _DOMAIN, text
+        host = host.strip(".")
+        if not host or "*" in host:
+            raise ValueError(f"invalid blocklist rule {rule!r} in {self.source}")
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.setdefault(label, {})
+        node[kind] = text
+        self._rules.append(text)
+
+    def match(self, host: str) -> Optional[str]:
+        """The rule blocking ``host``, or None."""
+        labels = host.lower().strip(".").split(".")
+        node = self._root
+        for depth, label in enumerate(reversed(labels), 1):
+            node = node.get(label)
+            if node is None:
+                break
+            if _DOMAIN in node:
+                return node[_DOMAIN]
+            if depth < len(labels) and _SUB in node:
+                return node[_SUB]
+            if depth == len(labels) and _EXACT in node:
+                return node[_EXACT]
+        if self._any_suffix:
+            label = _registrable_label(labels)
+            if label is not None:
+                return self._any_suffix.get(label)
+        return None
+
+    def __contains__(self, host: str) -> bool:
+        return self.match(host) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rules)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+
+def load_blocklist(path: str) -> Blocklist:
+    with open(path, "r", encoding="utf-8") as f:
+        return Blocklist(f, source=path)
+
+
+_blocklist = load_blocklist(BLOCKLIST_PATH)
+
+
+def get_blocklist() -> Blocklist:
+    return _blocklist
@@ -0,0 +1,143 @@
+"""Process pool for CPU-bound work (HTML text extraction, scoring).
+
+Fetching stays on the event loop; ``run`` ships a picklable function call
+to a pool of worker processes so parsing does not hold the loop's GIL.
+The pool is sized to the CPUs the container may actually use (affinity
+mask and cgroup quota, not the host's core count). At most
+``CPU_QUEUE`` jobs per worker are in flight; callers beyond that wait in
+``run``, which holds back the fetch stage and keeps buffered pages bounded.
+
+``CPU_WORKERS=0`` (or a single available CPU with the default ``auto``)
+runs everything inline.
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+CPU_WORKERS = os.getenv("CPU_WORKERS", "auto")       # "auto", or a worker count (0 = inline)
+CPU_QUEUE = int(os.getenv("CPU_QUEUE", "2"))         # jobs in flight per worker
+
+
+def _cgroup_cpu_limit() -> Optional[int]:
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return math.ceil(int(quota) / int(period)) if quota != "max" else None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1: quota is -1 when unlimited
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return math.ceil(quota / period) if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        n = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit:
+        n = min(n, limit)
+    return max(1, n)
+
+
+def _worker_count() -> int:
+    if CPU_WORKERS == "auto":
+        n = available_cpus()
+        return n if n > 1 else 0  # one CPU: a pool only adds IPC
+    return max(0, int(CPU_WORKERS))
+
+
+_workers: Optional[int] = None
+
+
+def worker_count() -> int:
+    """Pool size, worked out once: ``auto`` reads the affinity mask and cgroup files."""
+    global _workers
+    if _workers is None:
+        _workers = _worker_count()
+    return _workers
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_counters = {"jobs": 0, "inline": 0, "in_flight": 0, "broken": 0}
+
+
+def _get_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if workers == 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a process that runs an event loop, Playwright
+                # and SQLite connections is not safe
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _slot(workers: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _slots.get(loop)
+    if sem is None:
+        sem = _slots[loop] = asyncio.Semaphore(max(1, workers * CPU_QUEUE))
+    return sem
+
+
+async def run(fn: Callable[..., T], *args: Any) -> T:
+    """``fn(*args)`` in the pool (inline when disabled); waits for a free slot first."""
+    workers = worker_count()
+    pool = _get_pool(workers)
+    if pool is None:
+        _counters["inline"] += 1
+        return fn(*args)
+    async with _slot(workers):
+        _counters["in_flight"] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool for later jobs
+            _counters["broken"] += 1
+            _reset(pool)
+            raise
+        finally:
+            _counters["in_flight"] -= 1
+            _counters["jobs"] += 1
+
+
+def _reset(broken: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def cpu_stats() -> Dict:
+    return {"workers": worker_count(), "available_cpus": available_cpus(),
+            "running": _pool is not None, **_counters}
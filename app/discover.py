@@ -0,0 +1,192 @@
+"""Partner page discovery: pick the pages worth scoring from the site itself.
+
+Instead of guessing paths, candidates come from the homepage's own links.
+Only when those name fewer relevant pages than wanted are the site's
+sitemaps read too (the ``Sitemap:`` lines in robots.txt, else
+``/sitemap.xml``, following one level of sitemap index). Each candidate is
+ranked by the words in its path and link text: section names such as
+about/services/case studies, plus every keyword of the scoring rules.
+Legal pages, blog archives and assets are dropped, and deep paths rank
+lower. Only the top few are fetched, at most one per top-level section
+until every section is covered.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from . import cpu, http_client, metrics
+from .html_parse import iter_links
+from .score import Rules, get_rules
+from .scrape_directory import HEADERS
+
+DISCOVER_SITEMAPS = int(os.getenv("DISCOVER_SITEMAPS", "3"))         # child sitemaps read from an index
+DISCOVER_MAX_URLS = int(os.getenv("DISCOVER_MAX_URLS", "2000"))      # sitemap URLs considered per site
+SITEMAP_MAX_CHARS = 2_000_000
+
+# Path words that mark a page about the company itself
+SECTION_POINTS = {
+    "about": 4, "company": 3, "team": 2, "who": 1,
+    "services": 4, "solutions": 4, "expertise": 3, "offering": 2,
+    "case": 3, "studies": 2, "customers": 3, "clients": 3, "work": 1, "projects": 1,
+    "industries": 3, "verticals": 3, "sectors": 2,
+    "security": 3, "compliance": 3, "trust": 2, "partners": 1,
+}
+
+# Segments of pages that never help scoring
+SKIP_SEGMENTS = {
+    "tag", "tags", "category", "categories", "author", "page", "feed", "search",
+    "privacy", "privacy-policy", "terms", "terms-of-service", "legal", "imprint", "impressum",
+    "cookie", "cookies", "cookie-policy", "login", "signin", "sign-in", "signup", "register",
+    "cart", "checkout", "account", "wp-admin", "wp-content", "wp-json", "cdn-cgi",
+}
+# Archives with many near-identical pages; only their index is worth a look
+ARCHIVE_SEGMENTS = {"blog", "news", "posts", "articles", "insights", "events", "press", "jobs"}
+
+ASSET_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".zip",
+                    ".xml", ".gz", ".css", ".js", ".json", ".mp4", ".mp3", ".woff", ".woff2")
+
+_LOCALE = re.compile(r"^[a-z]{2}(?:[-_][a-z]{2})?$")
+_LOC = re.compile(r"<loc>\s*(.*?)\s*</loc>", re.I | re.S)
+
+
+def _same_site(host: str, domain: str) -> bool:
+    return host == domain or host.endswith("." + domain)
+
+
+def _normalise(url: str) -> str:
+    # One key per page: no query/fragment/trailing slash, www. folded into the apex
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    host = host[4:] if host.startswith("www.") else host
+    path = parts.path.rstrip("/") or "/"
+    return f"{parts.scheme}://{host}{path}"
+
+
+def site_links(html: str, base_url: str, domain: str) -> Dict[str, str]:
+    """Same-site page links of ``html`` as ``{url: link text}`` (CPU pool job)."""
+    links: Dict[str, str] = {}
+    for href, text in iter_links(html):
+        url = urljoin(base_url, href.strip())
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not _same_site((parts.hostname or ""), domain):
+            continue
+        url = _normalise(url)
+        text = " ".join(text.split())[:80]
+        if text and len(text) > len(links.get(url, "")):
+            links[url] = text
+        else:
+            links.setdefault(url, "")
+    return links
+
+
+async def _get(url: str, max_chars: Optional[int] = None) -> str:
+    try:
+        return await http_client.get_text(url, headers=HEADERS, max_chars=max_chars, retries=0)
+    except Exception:
+        return ""
+
+
+def _child_sitemap_order(url: str) -> int:
+    # WordPress/Yoast style names: page-sitemap.xml before post/product/taxonomy ones
+    name = url.rsplit("/", 1)[-1].lower()
+    if "page" in name:
+        return 0
+    if any(w in name for w in ("post", "product", "tag", "category", "author", "image", "video")):
+        return 2
+    return 1
+
+
+async def sitemap_urls(domain: str) -> List[str]:
+    """Page URLs listed in ``domain``'s sitemaps, [] when it has none."""
+    robots = await _get(f"https://{domain}/robots.txt", max_chars=100_000)
+    sitemaps = [line.split(":", 1)[1].strip() for line in robots.splitlines()
+                if line.lower().startswith("sitemap:")]
+    sitemaps = sitemaps or [f"https://{domain}/sitemap.xml"]
+
+    urls: List[str] = []
+    for sitemap in sitemaps[:DISCOVER_SITEMAPS]:
+        body = await _get(sitemap, max_chars=SITEMAP_MAX_CHARS)
+        locs = _LOC.findall(body)
+        if "<sitemapindex" in body[:2000].lower():
+            children = sorted((u for u in locs if not u.endswith(".gz")), key=_child_sitemap_order)
+            # Post/product/taxonomy sitemaps only when the site has nothing else
+            children = [u for u in children if _child_sitemap_order(u) < 2] or children
+            for child in children[:DISCOVER_SITEMAPS]:
+                urls.extend(_LOC.findall(await _get(child, max_chars=SITEMAP_MAX_CHARS)))
+        else:
+            urls.extend(locs)
+        if len(urls) >= DISCOVER_MAX_URLS:
+            break
+    return urls[:DISCOVER_MAX_URLS]
+
+
+def _score(url: str, text: str, rules: Rules) -> Tuple[int, str]:
+    """``(relevance, section)``; relevance <= 0 means not worth fetching."""
+    segments = [s for s in urlsplit(url).path.lower().split("/") if s]
+    if segments and _LOCALE.match(segments[0]):
+        locale = segments.pop(0)
+        penalty = 0 if locale.startswith("en") else 2
+    else:
+        penalty = 0
+    if not segments or segments[-1].endswith(ASSET_EXTENSIONS):
+        return 0, ""
+    if any(s in SKIP_SEGMENTS for s in segments):
+        return 0, ""
+    if segments[0] in ARCHIVE_SEGMENTS and len(segments) > 1:
+        return 0, ""
+
+    words = " ".join(s.replace("-", " ").replace("_", " ") for s in segments)
+    score = sum(SECTION_POINTS.get(w, 0) for w in set(words.split()))
+    found = rules.match_keywords(f"{words} {text}")
+    score += sum(pts for _, _, kws in rules.categories for kw, pts in kws.items() if kw in found)
+    score -= 2 * (len(segments) - 1) + penalty
+    return score, segments[0]
+
+
+def rank(candidates: Dict[str, str], limit: int, rules: Optional[Rules] = None) -> List[str]:
+    """The ``limit`` most relevant of ``{url: link text}``, one per section first."""
+    rules = rules or get_rules()
+    scored = []
+    for url, text in candidates.items():
+        score, section = _score(url, text, rules)
+        if score > 0:
+            scored.append((-score, len(url), url, section))
+    scored.sort()
+
+    picked: List[str] = []
+    seen_sections = set()
+    for _, _, url, section in scored:
+        if section not in seen_sections:
+            seen_sections.add(section)
+            picked.append(url)
+    for _, _, url, _ in scored:
+        if url not in picked:
+            picked.append(url)
+    return picked[:limit]
+
+
+async def discover_pages(domain: str, home_url: str, home_html: str, limit: int) -> List[str]:
+    """Up to ``limit`` pages of ``domain`` worth scoring, best first.
+
+    Returns [] when neither the homepage links nor a sitemap name a relevant
+    page; callers then fall back to guessing paths.
+    """
+    if limit <= 0:
+        return []
+    candidates: Dict[str, str] = {}
+    if home_html:
+        try:
+            candidates = await cpu.run(site_links, home_html, home_url, domain)
+        except Exception as e:
+            metrics.error("discover", domain, e)
+    candidates.pop(_normalise(home_url), None)
+    picked = rank(candidates, limit)
+    if len(picked) >= limit:
+        return picked  # the homepage alone is enough; skip robots.txt and sitemaps
+    for url in await sitemap_urls(domain):
+        parts = urlsplit(url)
+        if _same_site(parts.hostname or "", domain):
+            candidates.setdefault(_normalise(url), "")
+    candidates.pop(_normalise(home_url), None)
+    return rank(candidates, limit)
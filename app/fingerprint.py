@@ -0,0 +1,91 @@
+"""Page fingerprints for spotting repeated content within one site.
+
+Client-side routed apps and soft 404s answer every path with the same
+page. A ``Fingerprint`` holds an exact hash of the whitespace-collapsed,
+lower-cased text plus a 64-bit SimHash over its word 3-shingles. Two pages
+whose SimHashes differ in at most ``NEAR_DUP_BITS`` bits are treated as
+copies, which catches shells that only echo a timestamp. Path-like tokens
+(anything with a ``/``, such as an echoed ``/about`` or a full URL) are
+dropped first, so a soft 404 naming the requested path matches its twin
+exactly. SimHash is noisy with only a few shingles, so pages under
+``SHORT_WORDS`` words (typical of soft 404s) also keep their word set and
+are compared by Jaccard similarity instead.
+"""
+import hashlib
+import os
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+
+NEAR_DUP_BITS = int(os.getenv("NEAR_DUP_BITS", "3"))             # max differing SimHash bits for a copy
+FINGERPRINT_CHARS = int(os.getenv("FINGERPRINT_CHARS", "4000"))  # text fingerprinted per page
+SHORT_WORDS = 64          # below this, compare word sets instead of SimHash
+SHORT_JACCARD = 0.8       # word-set similarity at which two short pages are copies
+
+_BITS = 64
+
+
+class Fingerprint(NamedTuple):
+    exact: str
+    simhash: int
+    words: FrozenSet[str] = frozenset()  # short pages only
+
+
+def _shingles(words: List[str], n: int = 3) -> List[str]:
+    if len(words) <= n:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+
+
+def simhash(text: str) -> int:
+    shingles = set(_shingles(text.lower().split()))
+    # All shingle hashes as one bit string; bit i of every hash is bits[i::64]
+    bits = "".join(format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"),
+                          f"0{_BITS}b") for s in shingles)
+    half = len(shingles) / 2
+    out = 0
+    for i in range(_BITS):
+        out = (out << 1) | (bits[i::_BITS].count("1") > half)
+    return out
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in text.lower().split() if "/" not in w]
+
+
+def fingerprint(text: str) -> Fingerprint:
+    words = _words(text)
+    normalised = " ".join(words)
+    return Fingerprint(hashlib.sha1(normalised.encode("utf-8")).hexdigest(), simhash(normalised),
+                       frozenset(words) if len(words) < SHORT_WORDS else frozenset())
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def near(a: Fingerprint, b: Fingerprint, max_bits: int = NEAR_DUP_BITS) -> bool:
+    if a.words and b.words:
+        return len(a.words & b.words) / len(a.words | b.words) >= SHORT_JACCARD
+    if a.words or b.words:
+        return False  # one short page, one long: not the same page
+    return distance(a.simhash, b.simhash) <= max_bits
+
+
+class SeenPages:
+    """Fingerprints of the pages kept so far for one site."""
+
+    def __init__(self, max_bits: int = NEAR_DUP_BITS) -> None:
+        self.max_bits = max_bits
+        self.pages: List[Tuple[str, Fingerprint]] = []
+
+    def match(self, fp: Fingerprint) -> Optional[Tuple[str, str]]:
+        """``(url, "exact" | "near")`` of a kept page ``fp`` copies, else None."""
+        for url, seen in self.pages:
+            if seen.exact == fp.exact:
+                return url, "exact"
+        for url, seen in self.pages:
+            if near(seen, fp, self.max_bits):
+                return url, "near"
+        return None
+
+    def add(self, url: str, fp: Fingerprint) -> None:
+        self.pages.append((url, fp))
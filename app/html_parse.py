@@ -0,0 +1,245 @@
+"""HTML parsing behind one small interface with pluggable backends.
+
+``HTML_PARSER`` picks the backend: ``lxml``, ``selectolax`` (lexbor) or
+``bs4`` (BeautifulSoup with the stdlib parser, always available). The
+default ``auto`` takes the first one installed in that order: lxml streams,
+so budgeted text extraction stops tokenising early, which beats
+selectolax's faster full parse for scoring. ``python -m bench.parse``
+compares them. Every backend offers the same two operations:
+
+* ``visible_text(html, max_chars)``: whitespace-collapsed text outside
+  script/style/noscript/svg, stopping once ``max_chars`` is reached;
+* ``iter_links(html)``: ``(href, text)`` for every ``a[href]``.
+"""
+import os
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+# Content of these elements is never visible text
+SKIP_TAGS = ("script", "style", "noscript", "svg")
+
+# Chunk size when feeding the streaming parsers
+_FEED_CHARS = 16_384
+
+
+class _TextBudget:
+    """Collects whitespace-collapsed text nodes until ``max_chars`` is reached.
+
+    Streaming parsers may deliver one text node in several pieces (e.g. across
+    feed chunks), so pieces are buffered with ``add`` until ``flush`` at the
+    next tag.
+    """
+
+    def __init__(self, max_chars: Optional[int]) -> None:
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.size = 0
+        self.full = False
+        self._pending: List[str] = []
+
+    def add(self, data: str) -> None:
+        self._pending.append(data)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        words = "".join(self._pending).split()
+        self._pending.clear()
+        if not words:
+            return
+        chunk = " ".join(words)
+        self.parts.append(chunk)
+        self.size += len(chunk) + 1
+        if self.max_chars is not None and self.size > self.max_chars:
+            self.full = True
+
+    def text(self) -> str:
+        self.flush()
+        text = " ".join(self.parts)
+        return text[:self.max_chars] if self.max_chars is not None else text
+
+
+class _Stop(Exception):
+    pass
+
+
+class _StdlibText(HTMLParser):
+    def __init__(self, budget: _TextBudget) -> None:
+        super().__init__(convert_charrefs=True)
+        self.budget = budget
+        self.skip = 0
+
+    def _boundary(self) -> None:
+        self.budget.flush()
+        if self.budget.full:
+            raise _Stop
+
+    def handle_starttag(self, tag, attrs):
+        self._boundary()
+        if tag in SKIP_TAGS:
+            self.skip += 1
+
+    def handle_endtag(self, tag):
+        self._boundary()
+        if tag in SKIP_TAGS and self.skip:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.budget.add(data)
+
+
+def _bs4_text(html: str, max_chars: Optional[int]) -> str:
+    # bs4's html.parser builder is this tokenizer plus a tree; for text we
+    # only need the events, which lets us stop early.
+    budget = _TextBudget(max_chars)
+    parser = _StdlibText(budget)
+    try:
+        for i in range(0, len(html), _FEED_CHARS):
+            parser.feed(html[i:i + _FEED_CHARS])
+        parser.close()
+    except _Stop:
+        pass
+    return budget.text()
+
+
+def _bs4_links(html: str) -> Iterator[Tuple[str, str]]:
+    from bs4 import BeautifulSoup
+    for a in BeautifulSoup(html, "html.parser").select("a[href]"):
+        yield a.get("href") or "", a.get_text()
+
+
+class _LxmlTarget:
+    def __init__(self, budget: _TextBudget) -> None:
+        self.budget = budget
+        self.skip = 0
+
+    def start(self, tag, attrib):
+        self.budget.flush()
+        if tag in SKIP_TAGS:
+            self.skip += 1
+
+    def end(self, tag):
+        self.budget.flush()
+        if tag in SKIP_TAGS and self.skip:
+            self.skip -= 1
+
+    def data(self, data):
+        if not self.skip:
+            self.budget.add(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return None
+
+
+def _lxml_text(html: str, max_chars: Optional[int]) -> str:
+    from lxml import etree
+    budget = _TextBudget(max_chars)
+    parser = etree.HTMLParser(target=_LxmlTarget(budget), remove_comments=True)
+    for i in range(0, len(html), _FEED_CHARS):
+        parser.feed(html[i:i + _FEED_CHARS])
+        if budget.full:
+            break
+    else:
+        if html:
+            parser.close()
+    return budget.text()
+
+
+def _lxml_links(html: str) -> Iterator[Tuple[str, str]]:
+    import lxml.html
+    if not html.strip():
+        return
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        return
+    for a in doc.iter("a"):
+        href = a.get("href")
+        if href is not None:
+            yield href, a.text_content()
+
+
+def _selectolax_text(html: str, max_chars: Optional[int]) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(SKIP_TAGS))
+    budget = _TextBudget(max_chars)
+    if tree.root is not None:
+        for node in tree.root.traverse(include_text=True):
+            if node.tag == "-text":
+                budget.add(node.text_content or "")
+                budget.flush()
+                if budget.full:
+                    break
+    return budget.text()
+
+
+def _selectolax_links(html: str) -> Iterator[Tuple[str, str]]:
+    from selectolax.lexbor import LexborHTMLParser
+    for a in LexborHTMLParser(html).css("a[href]"):
+        yield a.attributes.get("href") or "", a.text(deep=True)
+
+
+class Backend:
+    def __init__(self, name: str, text: Callable[[str, Optional[int]], str],
+                 links: Callable[[str], Iterator[Tuple[str, str]]]) -> None:
+        self.name = name
+        self._text = text
+        self._links = links
+
+    def visible_text(self, html: str, max_chars: Optional[int] = None) -> str:
+        return self._text(html, max_chars)
+
+    def iter_links(self, html: str) -> Iterator[Tuple[str, str]]:
+        return self._links(html)
+
+
+_BACKENDS: Dict[str, Tuple[str, Backend]] = {
+    # name: (module that must be importable, backend)
+    "lxml": ("lxml.html", Backend("lxml", _lxml_text, _lxml_links)),
+    "selectolax": ("selectolax.lexbor", Backend("selectolax", _selectolax_text, _selectolax_links)),
+    "bs4": ("bs4", Backend("bs4", _bs4_text, _bs4_links)),
+}
+
+
+def available_backends() -> List[str]:
+    names = []
+    for name, (module, _) in _BACKENDS.items():
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name: str = "auto") -> Backend:
+    """The named backend, or for ``auto`` the preferred one installed."""
+    if name == "auto":
+        return _BACKENDS[available_backends()[0]][1]
+    if name not in _BACKENDS:
+        raise ValueError(f"unknown HTML_PARSER {name!r}; expected auto, {', '.join(_BACKENDS)}")
+    if name not in available_backends():
+        raise RuntimeError(f"HTML_PARSER={name} but {_BACKENDS[name][0]} is not installed")
+    return _BACKENDS[name][1]
+
+
+_backend = get_backend(HTML_PARSER)
+
+
+def backend_name() -> str:
+    return _backend.name
+
+
+def visible_text(html: str, max_chars: Optional[int] = None) -> str:
+    return _backend.visible_text(html, max_chars)
+
+
+def iter_links(html: str) -> Iterator[Tuple[str, str]]:
+    return _backend.iter_links(html)
@@ -0,0 +1,163 @@
+"""Persistent HTTP response cache used by ``http_client.get``.
+
+Successful GET responses are stored in SQLite keyed by URL. Within
+``HTTP_CACHE_TTL_S`` an entry is served without touching the network;
+after that it is revalidated with If-None-Match / If-Modified-Since and a
+304 refreshes it in place. Entries older than ``HTTP_CACHE_MAX_AGE_S`` are
+dropped, and least-recently-used entries go once the cache exceeds
+``HTTP_CACHE_MAX_BYTES``. One connection is shared behind a lock, so the
+methods may be called from worker threads (``http_client`` does).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+
+
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", ".cache/http.sqlite")  # empty disables the cache
+HTTP_CACHE_TTL_S = float(os.getenv("HTTP_CACHE_TTL_S", "3600"))
+HTTP_CACHE_MAX_AGE_S = float(os.getenv("HTTP_CACHE_MAX_AGE_S", str(30 * 86400)))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Eviction runs every this many stores rather than on every write
+_EVICT_EVERY = 50
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    headers: Dict[str, str]
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        h = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+    def to_response(self) -> httpx.Response:
+        return httpx.Response(200, headers=self.headers, content=self.body,
+                              request=httpx.Request("GET", self.url))
+
+
+class HttpCache:
+    def __init__(self, path: str, ttl_s: float = HTTP_CACHE_TTL_S,
+                 max_age_s: float = HTTP_CACHE_MAX_AGE_S, max_bytes: int = HTTP_CACHE_MAX_BYTES) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl_s = ttl_s
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY, headers TEXT, body BLOB, etag TEXT, last_modified TEXT,"
+            " stored_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+        self._stores = 0
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT headers, body, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(url, json.loads(row[0]), row[1], row[2], row[3], row[4])
+
+    def is_fresh(self, entry: CacheEntry, ttl_s: Optional[float] = None) -> bool:
+        return entry.age() < (self.ttl_s if ttl_s is None else ttl_s)
+
+    def record_hit(self, entry: CacheEntry) -> None:
+        with self._lock:
+            self.counters["hits"] += 1
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), entry.url))
+
+    def record_revalidated(self, entry: CacheEntry) -> None:
+        now = time.time()
+        with self._lock:
+            self.counters["revalidated"] += 1
+            self._db.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, entry.url)
+            )
+
+    def record_miss(self) -> None:
+        self.counters["misses"] += 1
+
+    def store(self, url: str, resp: httpx.Response) -> None:
+        body = resp.content
+        if len(body) > self.max_bytes:
+            return
+        headers = {k: v for k, v in resp.headers.items() if k.lower() == "content-type"}
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, json.dumps(headers), body, resp.headers.get("etag"),
+                 resp.headers.get("last-modified"), now, now, len(body)),
+            )
+            self.counters["stores"] += 1
+            self._stores += 1
+            due = self._stores % _EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones over the size budget."""
+        removed = 0
+        with self._lock:
+            cur = self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.max_age_s,))
+            removed += cur.rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                victims = []
+                for url, size in self._db.execute("SELECT url, size FROM responses ORDER BY accessed_at"):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((url,))
+                    total -= size
+                self._db.executemany("DELETE FROM responses WHERE url = ?", victims)
+                removed += len(victims)
+            self.counters["evictions"] += removed
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"enabled": True, "entries": entries, "bytes": size, **self.counters}
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[HttpCache]:
+    """The process-wide cache, or None when ``HTTP_CACHE_PATH`` is empty."""
+    global _cache
+    if _cache is None and HTTP_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HttpCache(HTTP_CACHE_PATH)
+    return _cache
+
+
+def cache_stats() -> Dict:
+    cache = get_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,210 @@
+"""Process-wide async HTTP client shared by every scraper.
+
+One ``httpx.AsyncClient`` is kept per event loop (the app has one; CLI
+wrappers get a short-lived one via ``run_sync``) so connections are reused
+across scrapers. Every request goes through a per-host concurrency cap and
+the same retry/backoff policy, requests are paced per host by the token
+buckets in ``ratelimit``, and GETs go through the on-disk response cache
+in ``http_cache``.
+"""
+import asyncio
+import os
+import random
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+from .http_cache import get_cache
+from .ratelimit import RateLimiter
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_PER_HOST = int(os.getenv("HTTP_PER_HOST", "4"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_S = float(os.getenv("HTTP_BACKOFF_S", "0.5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Transport for clients created from now on; None means the network
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def set_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Send requests from clients created after this call through ``transport``.
+
+    The benchmarks use it to replay recorded traffic; ``None`` restores the
+    network. Clients already bound to a running loop keep their transport.
+    """
+    global _transport
+    _transport = transport
+
+
+class _Engine:
+    def __init__(self) -> None:
+        self.client = httpx.AsyncClient(
+            http2=HTTP2,
+            transport=_transport,
+            follow_redirects=True,
+            timeout=HTTP_TIMEOUT_S,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+        )
+        self.hosts: Dict[str, asyncio.Semaphore] = {}
+        self.limiter = RateLimiter(robots=self._robots_txt)
+
+    async def _robots_txt(self, url: str) -> Optional[str]:
+        # Straight to the client: robots.txt is not paced or retried
+        resp = await self.client.get(url, timeout=10)
+        return resp.text if resp.status_code == 200 else None
+
+    def host_slot(self, host: str) -> asyncio.Semaphore:
+        sem = self.hosts.get(host)
+        if sem is None:
+            sem = self.hosts[host] = asyncio.Semaphore(max(1, HTTP_PER_HOST))
+        return sem
+
+
+_engines: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Engine]" = weakref.WeakKeyDictionary()
+
+
+def _engine() -> _Engine:
+    loop = asyncio.get_running_loop()
+    eng = _engines.get(loop)
+    if eng is None:
+        eng = _engines[loop] = _Engine()
+    return eng
+
+
+def get_client() -> httpx.AsyncClient:
+    return _engine().client
+
+
+async def aclose() -> None:
+    """Close the client bound to the running loop (app shutdown / end of CLI run)."""
+    eng = _engines.pop(asyncio.get_running_loop(), None)
+    if eng is not None:
+        await eng.client.aclose()
+
+
+def _backoff(attempt: int) -> float:
+    # Exponential with full jitter: 0.5s, 1s, 2s ... scaled by [0.5, 1)
+    return HTTP_BACKOFF_S * (2 ** attempt) * (0.5 + random.random() / 2)
+
+
+async def request(
+    method: str,
+    url: str,
+    *,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Send a request, retrying transport errors and ``RETRY_STATUSES``.
+
+    Each attempt waits for the host's rate limiter first; 429/503 responses
+    slow the host down (see ``ratelimit``). The last response is returned
+    as-is once retries are exhausted; callers decide whether to
+    ``raise_for_status``.
+    """
+    eng = _engine()
+    host = urlsplit(url).hostname or ""
+    attempts = (HTTP_RETRIES if retries is None else retries) + 1
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            await eng.limiter.acquire(host)
+            async with eng.host_slot(host):
+                resp = await eng.client.request(
+                    method, url, headers=headers, timeout=timeout or HTTP_TIMEOUT_S, **kwargs
+                )
+        except httpx.TransportError as e:
+            metrics.error("http", host, e)
+            if last:
+                raise
+        else:
+            metrics.http_response(host, resp.status_code, len(resp.content))
+            eng.limiter.record(host, resp.status_code, resp.headers.get("retry-after"))
+            if last or resp.status_code not in RETRY_STATUSES:
+                return resp
+        await asyncio.sleep(_backoff(attempt))
+    raise AssertionError("unreachable")
+
+
+async def throttle(url: str) -> None:
+    """Wait for ``url``'s host rate limiter, for fetches made outside this client (e.g. renders)."""
+    await _engine().limiter.acquire(urlsplit(url).hostname or "")
+
+
+async def get(
+    url: str,
+    *,
+    headers: Optional[Dict[str, str]] = None,
+    cache: bool = True,
+    ttl_s: Optional[float] = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """GET through the response cache.
+
+    A cached entry younger than ``ttl_s`` (default ``HTTP_CACHE_TTL_S``) is
+    returned directly; an older one is revalidated with a conditional GET.
+    Pass ``ttl_s=0`` to always revalidate, ``cache=False`` to bypass.
+    """
+    # SQLite reads and writes (bodies up to HTTP_CACHE_MAX_BYTES) run in a
+    # worker thread so they never stall the event loop
+    store = get_cache() if cache else None
+    entry = await asyncio.to_thread(store.lookup, url) if store is not None else None
+    if entry is not None and store.is_fresh(entry, ttl_s):
+        await asyncio.to_thread(store.record_hit, entry)
+        return entry.to_response()
+
+    if entry is not None:
+        headers = {**(headers or {}), **entry.conditional_headers()}
+    resp = await request("GET", url, headers=headers, **kwargs)
+
+    if store is not None:
+        if entry is not None and resp.status_code == 304:
+            await asyncio.to_thread(store.record_revalidated, entry)
+            return entry.to_response()
+        store.record_miss()
+        if resp.status_code == 200:
+            await asyncio.to_thread(store.store, url, resp)
+    return resp
+
+
+async def get_text(url: str, *, max_chars: Optional[int] = None, **kwargs: Any) -> str:
+    r = await get(url, **kwargs)
+    r.raise_for_status()
+    text = r.text
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars]
+    return text
+
+
+async def get_json(url: str, **kwargs: Any) -> Any:
+    r = await get(url, **kwargs)
+    r.raise_for_status()
+    return r.json()
+
+
+def run_sync(coro):
+    """Run ``coro`` to completion from sync code (CLI) and close its client."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await aclose()
+    return asyncio.run(main())
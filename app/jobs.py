@@ -0,0 +1,212 @@
+"""Background /process runs with ids, progress and cancellation.
+
+Only one job per directory runs at a time. Submitting the same parameters
+while one is active attaches to it; different parameters are refused with
+``JobConflict`` instead of starting an overlapping scrape.
+
+Memory stays flat however large the directory: a job keeps only its last
+``JOB_EVENT_BUFFER`` events for followers (plus the start and directory
+headers), and per-partner results only for the ``JOB_RESULTS_HISTORY``
+most recent non-streamed jobs.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .process import iter_process
+
+
+JOB_HISTORY = 50                                                    # finished jobs kept for inspection
+JOB_RESULTS_HISTORY = int(os.getenv("JOB_RESULTS_HISTORY", "5"))    # finished jobs whose results are kept
+JOB_EVENT_BUFFER = int(os.getenv("JOB_EVENT_BUFFER", "256"))        # recent events kept for followers
+
+_HEADER_EVENTS = ("start", "directory")
+
+
+class JobConflict(Exception):
+    """A job with different parameters is already running for the directory."""
+
+    def __init__(self, job: "Job") -> None:
+        super().__init__(f"job {job.id} is already running with {job.params}")
+        self.job = job
+
+
+class Job:
+    def __init__(self, key: str, params: Dict, stream: bool = False) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.total: Optional[int] = None
+        self.done = 0
+        self.failed = 0
+        self.stages: Dict[str, float] = {}
+        # Streamed runs hand each row to Sheets as it arrives and keep no results
+        self.ordered_writes = not stream
+        self.results: Optional[List[Dict]] = None if stream else []
+        self.summary: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._header: List[Dict] = []
+        self._events: Deque[Dict] = deque(maxlen=max(1, JOB_EVENT_BUFFER))
+        self._seq = 0  # events appended to _events so far
+        self._wake = asyncio.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def progress(self) -> Dict:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "directory": self.key,
+            "params": self.params,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "stages": self.stages,
+            "elapsed_s": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+    async def wait(self) -> "Job":
+        if self.task is not None:
+            # Shielded: a caller giving up must not cancel the shared job
+            await asyncio.wait([asyncio.shield(self.task)])
+        return self
+
+    async def follow(self) -> AsyncIterator[Dict]:
+        """The job's ``iter_process`` events until it ends.
+
+        Followers resume from their own cursor into the recent-event buffer;
+        events that already left it are reported as one ``skipped`` record.
+        """
+        sent_header = cursor = 0
+        while True:
+            wake = self._wake
+            while sent_header < len(self._header):
+                sent_header += 1
+                yield self._header[sent_header - 1]
+            while cursor < self._seq:
+                first = self._seq - len(self._events)
+                if cursor < first:
+                    skipped, cursor = first - cursor, first
+                    yield {"type": "skipped", "count": skipped}
+                    continue
+                cursor += 1
+                yield self._events[cursor - 1 - first]
+            if not self.active:
+                return
+            await wake.wait()
+
+    def _publish(self, event: Dict) -> None:
+        if event["type"] in _HEADER_EVENTS:
+            self._header.append(event)
+        else:
+            self._events.append(event)
+            self._seq += 1
+        self._notify()
+
+    def _notify(self) -> None:
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def _run(self) -> None:
+        self.status = "running"
+        self.started_at = time.time()
+        directory_at = last_partner_at = None
+        try:
+            async for event in iter_process(ordered_writes=self.ordered_writes, **self.params):
+                self._publish(event)
+                kind = event["type"]
+                now = time.time()
+                if kind == "directory":
+                    directory_at = now
+                    self.total = event["total"]
+                    self.stages["directory_s"] = round(now - self.started_at, 3)
+                elif kind == "partner":
+                    last_partner_at = now
+                    self.done += 1
+                    if event.get("status") != "ok":
+                        self.failed += 1
+                    if self.results is not None:
+                        self.results.append({k: v for k, v in event.items() if k != "type"})
+                    self.stages["scoring_s"] = round(now - directory_at, 3)
+                elif kind == "summary":
+                    self.stages["sheets_s"] = round(now - (last_partner_at or directory_at or now), 3)
+                    self.summary = {k: v for k, v in event.items() if k != "type"}
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+        except Exception as e:
+            self.status = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.finished_at = time.time()
+            self._notify()
+
+
+class JobManager:
+    def __init__(self) -> None:
+        self.jobs: Dict[str, Job] = {}
+
+    def active_for(self, key: str) -> Optional[Job]:
+        for job in self.jobs.values():
+            if job.key == key and job.active:
+                return job
+        return None
+
+    def submit(self, key: str = "default", stream: bool = False, **params) -> Tuple[Job, bool]:
+        """Start a job for ``key`` or attach to the one already running.
+
+        ``stream`` starts a job for a streaming client (see ``Job``). Returns
+        ``(job, attached)``; raises ``JobConflict`` when the running job has
+        different parameters.
+        """
+        params = {k: v for k, v in params.items() if v is not None}
+        job = self.active_for(key)
+        if job is not None:
+            if job.params != params:
+                raise JobConflict(job)
+            return job, True
+        job = Job(key, params, stream=stream)
+        self.jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(job._run())
+        self._trim()
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is not None and job.active and job.task is not None:
+            job.task.cancel()
+            if job.status == "queued":
+                # Never started, so _run will not record the outcome itself
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                job._notify()
+        return job
+
+    def _trim(self) -> None:
+        finished = sorted((j for j in self.jobs.values() if not j.active), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self.jobs[job.id]
+        for job in finished[:max(0, len(finished) - JOB_RESULTS_HISTORY)]:
+            job.results = None
+            job._events.clear()
+
+
+jobs = JobManager()
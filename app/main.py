@@ -1,18 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from collections import Counter
+import json
 
 from .scrape_directory import scrape_directory
 import os
 from fastapi import Depends, Header, HTTPException
 from .scrape_directory_json import fetch_experts_json, extract_domains, scrape_directory_json
-from .scrape_directory_crawl import crawl_directory
+from .scrape_directory_crawl import crawl_directory_report
 from .scrape_partner import scrape_partner as _scrape_partner
-from .process import process_all
-from .render import render_html_sync, render_collect_hrefs_sync
+from .jobs import JobConflict, jobs
+from .render import (
+    render_html, render_collect_hrefs_allframes, render_collect_hrefs_with_stats,
+    start_pool, stop_pool, pool_stats,
+)
+from . import cpu, http_client, metrics
+from .http_cache import cache_stats
+from .ratelimit import rate_limit_stats
+from .score import get_rules, reload_rules
+
 
-app = FastAPI(title="n8n Partner Scraper")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await start_pool()
+    except Exception as e:
+        # Rendering falls back to a one-off browser per call
+        print(f"[lifespan] Browser pool unavailable: {e}")
+    yield
+    await stop_pool()
+    await http_client.aclose()
+    # Waits for the worker processes to exit; keep the loop free meanwhile
+    await asyncio.to_thread(cpu.shutdown)
+
+
+app = FastAPI(title="n8n Partner Scraper", lifespan=lifespan)
 
 class ScrapeRequest(BaseModel):
     url: Optional[str] = None
@@ -32,30 +59,55 @@ def index():
         "/scrape-directory/json",
         "/scrape-directory/crawl",
         "/debug-render",
+        "/render/stats",
+        "/cache/stats",
+        "/metrics",
+        "/rules",
+        "/process/stream",
+        "/jobs",
         "/docs",
     ]}
 
 @app.get("/debug-render")
-def debug_render(url: str, wait_ms: int = 2500):
+async def debug_render(url: str, wait_ms: int = 2500, fast: Optional[bool] = None):
     # Call Playwright directly and show what it sees
-    hrefs = render_collect_hrefs_sync(url, wait_ms)
+    hrefs, stats = await render_collect_hrefs_with_stats(url, wait_ms, fast)
     hosts = [h.split("//",1)[-1].split("/",1)[0].split(":")[0].lower().strip(".") for h in hrefs]
     top_hosts = [f"{h}:{c}" for h,c in Counter(hosts).most_common(12)]
-    return {"href_count": len(hrefs), "top_hosts": top_hosts, "sample": hrefs[:10]}
+    return {"href_count": len(hrefs), "top_hosts": top_hosts, "sample": hrefs[:10], "render": stats}
+
+@app.get("/render/stats")
+def render_stats():
+    return pool_stats()
+
+@app.get("/cache/stats")
+def http_cache_stats():
+    return cache_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Stage histograms and counters, plus the pools' current stats as gauges
+    body = metrics.render_prometheus({
+        "http_cache": cache_stats(),
+        "render_pool": pool_stats(),
+        "cpu_pool": cpu.cpu_stats(),
+        "rate_limit": rate_limit_stats(),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 @app.post("/scrape-directory")
-def scrape_directory_endpoint(payload: ScrapeRequest):
+async def scrape_directory_endpoint(payload: ScrapeRequest):
     urls: List[str] = []
     if payload.urls: urls.extend(payload.urls)
     if payload.url: urls.append(payload.url)
     if not urls:
         return {"count": 0, "domains": [], "note": "Provide 'url' or 'urls'."}
 
-    domains, mode, top_hosts = scrape_directory(
+    domains, mode, top_hosts = await scrape_directory(
         urls=urls,
         use_js=True,  # force JS for reliability
-        renderer=render_html_sync,
-        renderer_hrefs=render_collect_hrefs_sync,
+        renderer=render_html,
+        renderer_hrefs=render_collect_hrefs_allframes,
         wait_ms=payload.wait_ms,
     )
     return {"count": len(domains), "mode": mode, "top_raw_hosts": top_hosts, "domains": domains}
@@ -66,13 +118,13 @@ class JsonScrapeRequest(BaseModel):
 
 
 @app.post("/scrape-directory/json")
-def scrape_directory_json_endpoint(payload: Optional[dict] = None):
+async def scrape_directory_json_endpoint(payload: Optional[dict] = None):
     # New contract: optional body { feed_urls?: list[str] }, otherwise default feeds
     feed_urls = None
     if payload and isinstance(payload, dict):
         feed_urls = payload.get("feed_urls")
     try:
-        return scrape_directory_json(feed_urls)
+        return await scrape_directory_json(feed_urls)
     except Exception as e:
         return {"count": 0, "domains": [], "error": str(e)}
 
@@ -83,10 +135,10 @@ class CrawlRequest(BaseModel):
 
 
 @app.post("/scrape-directory/crawl")
-def scrape_directory_crawl_endpoint(payload: CrawlRequest):
+async def scrape_directory_crawl_endpoint(payload: CrawlRequest):
     try:
-        domains = crawl_directory(payload.url, limit_profiles=payload.limit_profiles)
-        return {"count": len(domains), "domains": domains}
+        report = await crawl_directory_report(payload.url, limit_profiles=payload.limit_profiles)
+        return {"count": len(report["domains"]), **report}
     except Exception as e:
         return {"count": 0, "domains": [], "error": str(e)}
 
@@ -97,9 +149,9 @@ class PartnerReq(BaseModel):
 
 
 @app.post("/scrape-partner")
-def scrape_partner_endpoint(payload: PartnerReq):
+async def scrape_partner_endpoint(payload: PartnerReq):
     try:
-        return _scrape_partner(payload.domain, limit_pages=payload.limit_pages)
+        return await _scrape_partner(payload.domain, limit_pages=payload.limit_pages)
     except Exception as e:
         return {"error": str(e)}
 
@@ -112,9 +164,120 @@ def require_bearer(Authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
+def _submit(**params):
+    try:
+        return jobs.submit(**params)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job": e.job.progress()})
+
+
 @app.post("/process")
-def process_endpoint(_=Depends(require_bearer)):
-    return process_all()
+async def process_endpoint(
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    mode: Literal["full", "incremental", "rescore"] = "full",
+    _=Depends(require_bearer),
+):
+    # Runs as a background job (or attaches to the active one) and waits for it
+    job, _attached = _submit(concurrency=concurrency, per_host=per_host, deadline_s=deadline_s, mode=mode)
+    await job.wait()
+    if job.status == "failed":
+        raise HTTPException(status_code=502, detail=job.error)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=409, detail=f"job {job.id} was cancelled")
+    return job.summary
+
+
+@app.post("/jobs/process", status_code=202)
+async def submit_process_job(
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    mode: Literal["full", "incremental", "rescore"] = "full",
+    _=Depends(require_bearer),
+):
+    job, attached = _submit(concurrency=concurrency, per_host=per_host, deadline_s=deadline_s, mode=mode)
+    return {"job_id": job.id, "attached": attached, **job.progress()}
+
+
+@app.get("/jobs")
+def list_jobs(_=Depends(require_bearer)):
+    return [j.progress() for j in sorted(jobs.jobs.values(), key=lambda j: -j.created_at)]
+
+
+def _job_or_404(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, _=Depends(require_bearer)):
+    return _job_or_404(job_id).progress()
+
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str, _=Depends(require_bearer)):
+    job = _job_or_404(job_id)
+    if job.results is None:
+        raise HTTPException(status_code=410, detail="Results of this job are not kept (streamed or expired)")
+    return {
+        "status": job.status,
+        "results": sorted(job.results, key=lambda r: r.get("domain", "")),
+        "summary": job.summary,
+    }
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, _=Depends(require_bearer)):
+    # async: the job's task belongs to this loop and must be cancelled from it
+    _job_or_404(job_id)
+    return jobs.cancel(job_id).progress()
+
+
+@app.post("/process/stream")
+async def process_stream_endpoint(
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    mode: Literal["full", "incremental", "rescore"] = "full",
+    format: Literal["ndjson", "sse"] = "ndjson",
+    _=Depends(require_bearer),
+):
+    # One record per scored partner as it finishes, then a summary record. The run is
+    # a job like /process, so it never overlaps one; a client leaving does not stop it.
+    job, _attached = _submit(stream=True, concurrency=concurrency, per_host=per_host,
+                             deadline_s=deadline_s, mode=mode)
+
+    def encode(event):
+        if format == "sse":
+            return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+
+    async def body():
+        async for event in job.follow():
+            yield encode(event)
+        if job.status != "done":
+            yield encode({"type": "error", "job_id": job.id, "status": job.status, "error": job.error})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/rules")
+def rules_summary():
+    return get_rules().summary()
+
+
+@app.post("/rules/reload")
+def rules_reload(_=Depends(require_bearer)):
+    # Re-read SCORING_RULES_PATH; the previous rules stay live on error
+    try:
+        return reload_rules().summary()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # --- CORS / readiness / version middleware & endpoints ---
 import os
@@ -0,0 +1,208 @@
+"""In-process metrics: stage latency histograms and error/traffic counters.
+
+Hot paths call ``timed(stage)`` / ``error(stage, host)`` / ``http_response``
+/ ``duplicate_page``.
+Everything lands in the process-wide registry, exposed in Prometheus text
+format by ``render_prometheus`` (served at ``/metrics``). While a
+``run_scope`` is active, the same observations are also collected for that
+run alone. The scope is carried in a context variable, so it covers tasks
+and ``asyncio.to_thread`` calls started inside it, and ``RunMetrics.summary``
+reports them with the run's result.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Stage latency buckets in seconds: sub-ms parsing up to multi-second renders
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # stage -> [bucket counts..., +Inf count], sum
+        self.stages: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            buckets, total = self.stages.setdefault(stage, ([0] * (len(BUCKETS) + 1), [0.0]))
+            buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            total[0] += seconds
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+
+_registry = _Registry()
+
+_HELP = {
+    "stage_seconds": "Time spent per pipeline stage",
+    "errors_total": "Failures swallowed or reported by a stage, per host",
+    "http_requests_total": "HTTP responses received, per host and status",
+    "http_bytes_total": "Response body bytes downloaded, per host",
+    "duplicate_pages_total": "Fetched pages dropped as copies of another page on the same site",
+}
+
+
+class RunMetrics:
+    """Observations made while one run's scope was active."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.host_errors: Dict[str, int] = {}
+        self.requests = 0
+        self.bytes = 0
+        self.duplicates = 0
+
+    def summary(self) -> Dict:
+        with self._lock:
+            stages = {}
+            for stage, values in sorted(self.samples.items()):
+                ordered = sorted(values)
+                n = len(ordered)
+                stages[stage] = {
+                    "count": n,
+                    "total_s": round(sum(ordered), 3),
+                    "p50_s": round(ordered[(n - 1) // 2], 4),
+                    "p95_s": round(ordered[min(n - 1, int(n * 0.95))], 4),
+                    "max_s": round(ordered[-1], 4),
+                }
+            top_hosts = sorted(self.host_errors.items(), key=lambda kv: -kv[1])[:20]
+            return {
+                "elapsed_s": round(time.monotonic() - self.started, 3),
+                "stages": stages,
+                "errors": dict(sorted(self.errors.items())),
+                "duplicate_pages": self.duplicates,
+                "http": {"requests": self.requests, "bytes": self.bytes,
+                         "errors_by_host": dict(top_hosts)},
+            }
+
+
+_run: ContextVar[Optional[RunMetrics]] = ContextVar("metrics_run", default=None)
+
+
+@contextmanager
+def run_scope() -> Iterator[RunMetrics]:
+    run = RunMetrics()
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        try:
+            _run.reset(token)
+        except ValueError:
+            pass  # closed from another context (e.g. an abandoned stream)
+
+
+def observe(stage: str, seconds: float) -> None:
+    _registry.observe(stage, seconds)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.samples.setdefault(stage, []).append(seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the block's wall time under ``stage`` (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+def error(stage: str, host: str = "", exc: Optional[BaseException] = None) -> None:
+    """Count a failure in ``stage`` (optionally against ``host``)."""
+    kind = type(exc).__name__ if exc is not None else ""
+    _registry.inc("errors_total", stage=stage, host=host, kind=kind)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.errors[stage] = run.errors.get(stage, 0) + 1
+            if host:
+                run.host_errors[host] = run.host_errors.get(host, 0) + 1
+
+
+def http_response(host: str, status: int, nbytes: int) -> None:
+    _registry.inc("http_requests_total", host=host, status=str(status))
+    _registry.inc("http_bytes_total", nbytes, host=host)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.requests += 1
+            run.bytes += nbytes
+
+
+def duplicate_page(host: str, match: str) -> None:
+    _registry.inc("duplicate_pages_total", host=host, match=match)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.duplicates += 1
+
+
+def _fmt_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(gauges: Optional[Dict[str, Dict]] = None, prefix: str = "scraper_") -> str:
+    """Prometheus text exposition of the registry.
+
+    ``gauges`` maps a group name to a stats dict (e.g. ``cache_stats()``);
+    each numeric entry becomes ``<prefix><group>_<key>``.
+    """
+    lines: List[str] = []
+    with _registry._lock:
+        stages = {s: (list(b), t[0]) for s, (b, t) in _registry.stages.items()}
+        counters = {n: dict(series) for n, series in _registry.counters.items()}
+
+    name = prefix + "stage_seconds"
+    lines += [f"# HELP {name} {_HELP['stage_seconds']}", f"# TYPE {name} histogram"]
+    for stage, (buckets, total) in sorted(stages.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), buckets):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{stage="{_escape(stage)}",le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{{stage="{_escape(stage)}"}} {total}')
+        lines.append(f'{name}_count{{stage="{_escape(stage)}"}} {cumulative}')
+
+    for counter in ("errors_total", "http_requests_total", "http_bytes_total", "duplicate_pages_total"):
+        name = prefix + counter
+        lines += [f"# HELP {name} {_HELP[counter]}", f"# TYPE {name} counter"]
+        for labels, value in sorted(counters.get(counter, {}).items()):
+            lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+
+    for group, stats in sorted((gauges or {}).items()):
+        for key, value in sorted(stats.items()):
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                name = f"{prefix}{group}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {value:g}"]
+    return "\n".join(lines) + "\n"
@@ -1,55 +1,350 @@
+import asyncio
 import os
+import re
+import time
 from datetime import datetime
-from typing import Dict
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
 
+from . import http_client, metrics
 from .scrape_directory_json import scrape_directory_json
-from .scrape_partner import scrape_partner
-from .sheets import append_row
-
-
-def process_all() -> Dict:
-    directory = scrape_directory_json()
-    domains = directory.get("domains", [])
-    name_map = directory.get("name_map", {})
-
-    counts = {"Enterprise": 0, "Mid-market": 0, "SMB": 0}
-
-    for domain in domains:
-        result = scrape_partner(domain, limit_pages=6)
-        tier = result.get("tier", "SMB")
-        if tier not in counts:
-            tier = "SMB"
-        counts[tier] += 1
-
-        # Prepare row
-        comps = result.get("score_components", {})
-        row = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "name": name_map.get(domain, ""),
-            "domain": domain,
-            "size_signals": comps.get("size_signals", 0),
-            "enterprise_security": comps.get("enterprise_security", 0),
-            "tech_stack": comps.get("tech_stack", 0),
-            "regulated_verticals": comps.get("regulated_verticals", 0),
-            "delivery_maturity": comps.get("delivery_maturity", 0),
-            "marketing_assets": comps.get("marketing_assets", 0),
-            "score_total": result.get("score_total", 0),
-            "tier": tier,
-            "sources": " ".join(result.get("sources", [])),
-        }
+from .scrape_partner import (
+    collect_partner_pages, content_hash, score_partner, score_partner_async, with_page_report,
+)
+from .score import Rules, get_rules
+from .sheets import LEAD_COLUMNS, TRAIL_COLUMNS, SheetWriter
+from .state import STATE_MAX_AGE_S, StateStore, get_store
+
+
+# Pipeline limits (overridable per call)
+PROCESS_CONCURRENCY = int(os.getenv("PROCESS_CONCURRENCY", "8"))    # domains in flight
+PROCESS_PER_HOST = int(os.getenv("PROCESS_PER_HOST", "2"))          # pages in flight per partner host
+PROCESS_DEADLINE_S = float(os.getenv("PROCESS_DEADLINE_S", "900"))  # whole-run budget
+
+
+def _columns(rules: Rules) -> List[str]:
+    # One score column per rules category, in rules-file order
+    return [*LEAD_COLUMNS, *(name for name, _, _ in rules.categories), *TRAIL_COLUMNS]
+
+
+def _build_row(domain: str, name: str, result: Dict, rules: Rules) -> Dict:
+    comps = result.get("score_components", {})
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "name": name,
+        "domain": domain,
+        **{cat: comps.get(cat, 0) for cat, _, _ in rules.categories},
+        "score_total": result.get("score_total", 0),
+        "tier": result.get("tier") or rules.default_tier,
+        "sources": " ".join(result.get("sources", [])),
+    }
+
+
+def _sheet_name(tier: str) -> str:
+    # Tab per tier: "Mid-market" -> "MidMarket"
+    return "".join(p[:1].upper() + p[1:] for p in re.split(r"[^A-Za-z0-9]+", tier)) or tier
+
+
+async def _process_domain(
+    domain: str,
+    name: str,
+    per_host: int,
+    incremental: bool,
+    store: Optional[StateStore],
+) -> Tuple[Dict, bool]:
+    """Fetch and score one partner; returns ``(result, changed)``.
+
+    In incremental mode a partner whose text hash matches its stored state,
+    scored under the current rules, younger than ``STATE_MAX_AGE_S`` and
+    already written to the sheet, reuses the stored result and is reported
+    unchanged. A new result is stored unwritten; ``iter_process`` marks it
+    written once its row is flushed.
+    """
+    pages = await collect_partner_pages(domain, 6, per_host)
+    text = pages["text"]
+    prev = await asyncio.to_thread(store.get, domain) if store is not None else None
+    if (incremental and prev is not None and prev.written and prev.content_hash == content_hash(text)
+            and prev.result.get("rules_version") == get_rules().version
+            and prev.age() < STATE_MAX_AGE_S):
+        return prev.result, False
+    result = with_page_report(await score_partner_async(domain, pages["sources"], text), pages)
+    if store is not None:
+        await asyncio.to_thread(store.put, domain, result["content_hash"], result, text=text, name=name)
+    return result, True
+
+
+def _iter_rescored(store: StateStore) -> Iterator[Tuple[str, str, Tuple[Dict, bool]]]:
+    """Re-apply the current rules to each partner's stored text, no fetching.
+
+    Only partners of the latest directory scrape are rescored. Yields
+    ``(domain, name, (result, changed))``; a partner counts as changed if
+    its tier or score moved, or its last row never reached the sheet. The
+    stored fetch time is kept, so ``STATE_MAX_AGE_S`` still forces a
+    refetch of stale partners.
+    """
+    for st in store.all(listed_only=True):
+        if st.text is None:
+            continue  # scored before text was kept; needs a fetch
+        result = score_partner(st.domain, st.result.get("sources", []), st.text)
+        changed = not st.written or (result["tier"], result["score_components"]) != (
+            st.result.get("tier"), st.result.get("score_components"))
+        store.put(st.domain, result["content_hash"], result, text=st.text, name=st.name,
+                  written=not changed, updated_at=st.updated_at)
+        yield st.domain, st.name, (result, changed)
+
+
+Outcome = Union[Tuple[Dict, bool], BaseException]
+
+RESCORE_CHUNK = 50  # partners rescored per worker-thread hop
+
+
+async def _iter_rescored_async(store: StateStore, name_map: Dict[str, str]) -> AsyncIterator[Tuple[str, Outcome]]:
+    """``_iter_rescored`` in chunks off the loop, filling ``name_map`` as it goes."""
+    rescored = _iter_rescored(store)
+    while True:
+        chunk = await asyncio.to_thread(lambda: list(islice(rescored, RESCORE_CHUNK)))
+        if not chunk:
+            return
+        for domain, name, outcome in chunk:
+            name_map[domain] = name
+            yield domain, outcome
+
+
+async def _iter_scored(
+    domains: List[str],
+    name_map: Dict[str, str],
+    concurrency: int,
+    per_host: int,
+    deadline_s: float,
+    incremental: bool = False,
+) -> AsyncIterator[Tuple[str, Outcome]]:
+    """Score ``domains`` and yield ``(domain, outcome)`` in completion order.
+
+    At most ``concurrency`` tasks exist at a time, so memory does not grow
+    with the directory. The outcome is ``(result, changed)`` or the
+    exception scoring raised. Domains not finished by the deadline are
+    cancelled and never yielded.
+    """
+    store = get_store()
+    deadline = time.monotonic() + deadline_s
+    queue = iter(domains)
+    running: Dict[asyncio.Task, str] = {}
+
+    def refill() -> None:
+        while len(running) < max(1, concurrency):
+            domain = next(queue, None)
+            if domain is None:
+                return
+            coro = _process_domain(domain, name_map.get(domain, ""), per_host, incremental, store)
+            running[asyncio.create_task(coro)] = domain
 
-        sheet_name = "Enterprise" if tier == "Enterprise" else ("MidMarket" if tier == "Mid-market" else "SMB")
+    refill()
+    try:
+        while running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(running, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                yield running.pop(t), (t.exception() or t.result())
+            refill()
+    finally:
+        for t in running:
+            t.cancel()
+        if running:
+            await asyncio.wait(running)
+
+
+class _RowSink:
+    """Sends rows to the sheet tabs.
+
+    ``ordered`` sinks hold rows until ``close`` and write them in domain
+    order; unordered sinks hand each row to the batching writer at once.
+    """
+
+    def __init__(self, ordered: bool, rules: Rules) -> None:
+        self.ordered = ordered
+        self.errors = 0
+        self._rows: List[Dict] = []
+        self._added: List[str] = []  # domains handed to the writer
         try:
-            append_row(sheet_name, row)
+            self.writer: Optional[SheetWriter] = SheetWriter(
+                tabs=[_sheet_name(t) for t in rules.tier_names], columns=_columns(rules))
         except Exception:
             # Allow running without Sheets configured
-            pass
+            self.writer = None
 
-    return {
-        "total": len(domains),
-        "enterprise": counts["Enterprise"],
-        "midmarket": counts["Mid-market"],
-        "smb": counts["SMB"],
-    }
+    async def _write(self, row: Dict) -> None:
+        if self.writer is None:
+            return
+        self._added.append(row["domain"])
+        try:
+            await asyncio.to_thread(self.writer.add, _sheet_name(row["tier"]), row)
+        except Exception as e:
+            metrics.error("sheet_write", exc=e)
+            self.errors += 1
+
+    async def add(self, row: Dict) -> None:
+        if self.ordered:
+            self._rows.append(row)
+        else:
+            await self._write(row)
+
+    async def close(self) -> None:
+        for row in sorted(self._rows, key=lambda r: r["domain"]):
+            await self._write(row)
+        self._rows = []
+        if self.writer is not None:
+            try:
+                await asyncio.to_thread(self.writer.flush)
+            except Exception as e:
+                metrics.error("sheet_write", exc=e)
+                self.errors += 1
+
+    def pending(self) -> int:
+        return self.writer.pending() if self.writer is not None else 0
+
+    def written(self) -> List[str]:
+        """Domains whose rows reached the sheet (call after ``close``)."""
+        if self.writer is None:
+            return []
+        pending = {row["domain"] for row in self.writer.pending_rows()}
+        return [d for d in self._added if d not in pending]
+
+
+async def iter_process(
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    mode: str = "full",
+    ordered_writes: bool = False,
+) -> AsyncIterator[Dict]:
+    """Run the pipeline, yielding one event per step as it happens.
+
+    Events, in order: ``start``; ``directory`` with the partner count; one
+    ``partner`` per scored (or failed) partner in completion order; and a
+    final ``summary`` with the same counts ``process_all`` returns, plus
+    the run's stage timings and error counts under ``metrics``.
+
+    ``mode="incremental"`` only writes rows for partners whose content
+    changed (or whose state is stale); the others still count toward the
+    tier totals using their stored score. ``mode="rescore"`` fetches
+    nothing: it re-applies the current rules to the stored text of every
+    partner in the latest directory scrape and writes rows for those whose
+    score moved; known partners no longer listed are reported as
+    ``departed``.
+
+    Sheet columns and tier tabs follow the rules active when the run starts.
+    """
+    if mode not in ("full", "incremental", "rescore"):
+        raise ValueError(f"unknown mode: {mode}")
+    with metrics.run_scope() as run:
+        started = time.monotonic()
+        deadline_s = PROCESS_DEADLINE_S if deadline_s is None else deadline_s
+        rules = get_rules()
+        departed: List[str] = []
+        domains: List[str] = []
+        name_map: Dict[str, str] = {}
+        yield {"type": "start", "mode": mode, "rules_version": rules.version}
+
+        if mode == "rescore":
+            store = get_store()
+            if store is None:
+                raise RuntimeError("rescore needs partner state (STATE_PATH)")
+            # Streamed from the store a chunk at a time; never the whole list
+            total = await asyncio.to_thread(store.count, listed_only=True, with_text=True)
+            departed = await asyncio.to_thread(store.departed)
+            scored = _iter_rescored_async(store, name_map)
+        else:
+            directory = await scrape_directory_json()
+            domains = directory.get("domains", [])
+            name_map = directory.get("name_map", {})
+            total = len(domains)
+            store = get_store()
+            if store is not None and domains:
+                await asyncio.to_thread(store.set_directory, domains)
+            scored = _iter_scored(
+                domains,
+                name_map,
+                concurrency=concurrency or PROCESS_CONCURRENCY,
+                per_host=per_host or PROCESS_PER_HOST,
+                deadline_s=deadline_s - (time.monotonic() - started),
+                incremental=mode == "incremental",
+            )
+        yield {"type": "directory", "total": total}
+
+        counts = {tier: 0 for tier in rules.tier_names}
+        finished = set()
+        failed: List[str] = []
+        unchanged = 0
+        sink = _RowSink(ordered=ordered_writes, rules=rules)
+
+        try:
+            async for domain, outcome in scored:
+                finished.add(domain)
+                if isinstance(outcome, BaseException):
+                    failed.append(domain)
+                    yield {"type": "partner", "domain": domain, "status": "failed",
+                           "error": f"{type(outcome).__name__}: {outcome}"}
+                    continue
+                result, changed = outcome
+                row = _build_row(domain, name_map.pop(domain, ""), result, rules)
+                counts[row["tier"]] = counts.get(row["tier"], 0) + 1
+                if changed:
+                    await sink.add(row)
+                else:
+                    unchanged += 1
+                yield {"type": "partner", "status": "ok", "changed": changed, **row,
+                       "duplicate_pages": len(result.get("duplicate_pages", [])),
+                       "shell": result.get("shell", False)}
+        finally:
+            # Cancels in-flight scrapes if our consumer went away early
+            await scored.aclose()
+
+        await sink.close()
+        if store is not None:
+            await asyncio.to_thread(store.mark_written, sink.written())
+
+        yield {
+            "type": "summary",
+            "total": total,
+            # "enterprise", "midmarket", "smb" with the bundled rules
+            **{_sheet_name(tier).lower(): n for tier, n in counts.items()},
+            "tiers": counts,
+            "mode": mode,
+            "rules_version": rules.version,
+            "unchanged": unchanged,
+            "timed_out": sorted(d for d in domains if d not in finished),
+            "failed": sorted(failed),
+            "departed": departed,
+            "sheet_rows_pending": sink.pending(),
+            "sheet_errors": sink.errors,
+            "metrics": run.summary(),
+        }
+
+
+async def process_all_async(
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    mode: str = "full",
+) -> Dict:
+    """Score every directory partner and append rows to the tier tabs.
+
+    Rows are written in domain order, independent of completion order.
+    Returns the summary; see ``iter_process`` for the modes.
+    """
+    summary: Dict = {}
+    async for event in iter_process(concurrency, per_host, deadline_s, mode, ordered_writes=True):
+        if event["type"] == "summary":
+            summary = {k: v for k, v in event.items() if k != "type"}
+    return summary
 
 
+def process_all(
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    mode: str = "full",
+) -> Dict:
+    return http_client.run_sync(process_all_async(concurrency, per_host, deadline_s, mode))
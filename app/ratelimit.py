@@ -0,0 +1,180 @@
+"""Per-host request pacing: token buckets with adaptive backoff.
+
+Every host gets its own bucket refilling at ``RATE_LIMIT_RPS`` with room
+for ``RATE_LIMIT_BURST`` back-to-back requests, so one slow or strict host
+never holds back the others. ``RATE_LIMIT_HOSTS`` overrides the rate for
+particular hosts (``"experts.n8n.io=2,admin.partnerpage.io=2"``).
+
+A 429 or 503 halves the host's rate (down to ``RATE_LIMIT_MIN_RPS``) and a
+``Retry-After`` blocks the host until then; each success then adds back a
+tenth of the configured rate. With ``RESPECT_ROBOTS`` set, a host's
+robots.txt ``Crawl-delay`` caps its rate too, fetched once on first use.
+"""
+import asyncio
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.robotparser import RobotFileParser
+
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "5"))             # per host; 0 disables pacing
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))          # requests allowed back to back
+RATE_LIMIT_MIN_RPS = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.2"))   # floor after repeated throttling
+RATE_LIMIT_HOSTS = os.getenv("RATE_LIMIT_HOSTS", "")                 # "host=rps,host=rps"
+RETRY_AFTER_MAX_S = float(os.getenv("RETRY_AFTER_MAX_S", "120"))     # ignore longer Retry-After values
+RESPECT_ROBOTS = os.getenv("RESPECT_ROBOTS", "0") == "1"
+ROBOTS_USER_AGENT = os.getenv("ROBOTS_USER_AGENT", "MotivoScraper")
+
+THROTTLE_STATUSES = {429, 503}
+
+_counters = {"waits": 0, "wait_s": 0.0, "throttled": 0, "retry_after": 0, "robots_delays": 0}
+
+
+def _host_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        host, _, rate = item.strip().partition("=")
+        if host and rate:
+            rates[host.lower()] = float(rate)
+    return rates
+
+
+def retry_after_s(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, seconds)
+
+
+class _Bucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self) -> float:
+        """Wait for a token; returns the seconds spent waiting."""
+        waited = 0.0
+        # The lock queues callers, so tokens go out in arrival order
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.blocked_until - now
+                if delay <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def cap(self, rate: float) -> None:
+        self.base_rate = min(self.base_rate, rate)
+        self.rate = min(self.rate, rate)
+        self.burst = 1
+        self.tokens = min(self.tokens, 1.0)
+
+    def throttled(self, retry_after: Optional[float]) -> None:
+        self._refill(time.monotonic())
+        self.rate = max(min(RATE_LIMIT_MIN_RPS, self.base_rate), self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after is not None:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + min(retry_after, RETRY_AFTER_MAX_S))
+
+    def succeeded(self) -> None:
+        if self.rate < self.base_rate:
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+
+
+# Fetches a URL's body as text, or None when it is unavailable
+RobotsFetcher = Callable[[str], Awaitable[Optional[str]]]
+
+
+class RateLimiter:
+    """Token buckets for one event loop (``http_client`` keeps one per client)."""
+
+    def __init__(self, rps: float = RATE_LIMIT_RPS, burst: int = RATE_LIMIT_BURST,
+                 host_rates: Optional[Dict[str, float]] = None,
+                 robots: Optional[RobotsFetcher] = None) -> None:
+        self.rps = rps
+        self.burst = burst
+        self.host_rates = _host_rates(RATE_LIMIT_HOSTS) if host_rates is None else host_rates
+        self.robots = robots if RESPECT_ROBOTS else None
+        self.buckets: Dict[str, _Bucket] = {}
+        self._robots_checked: Dict[str, asyncio.Future] = {}
+
+    def _bucket(self, host: str) -> Optional[_Bucket]:
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate = self.host_rates.get(host, self.rps)
+            if rate <= 0:
+                return None
+            bucket = self.buckets[host] = _Bucket(rate, self.burst)
+        return bucket
+
+    async def _apply_robots(self, host: str, bucket: _Bucket) -> None:
+        checked = self._robots_checked.get(host)
+        if checked is None:
+            checked = self._robots_checked[host] = asyncio.get_running_loop().create_future()
+            try:
+                body = await self.robots(f"https://{host}/robots.txt")
+                if body:
+                    parser = RobotFileParser()
+                    parser.parse(body.splitlines())
+                    delay = parser.crawl_delay(ROBOTS_USER_AGENT)
+                    if delay:
+                        _counters["robots_delays"] += 1
+                        bucket.cap(1 / float(delay))
+            except Exception:
+                pass  # no usable robots.txt: no crawl-delay
+            finally:
+                checked.set_result(None)
+        await checked
+
+    async def acquire(self, host: str) -> None:
+        bucket = self._bucket(host)
+        if bucket is None:
+            return
+        if self.robots is not None:
+            await self._apply_robots(host, bucket)
+        waited = await bucket.take()
+        if waited:
+            _counters["waits"] += 1
+            _counters["wait_s"] += waited
+
+    def record(self, host: str, status: int, retry_after: Optional[str] = None) -> None:
+        """Adjust the host's rate after a response with ``status``."""
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            return
+        if status in THROTTLE_STATUSES:
+            delay = retry_after_s(retry_after)
+            _counters["throttled"] += 1
+            if delay is not None:
+                _counters["retry_after"] += 1
+            bucket.throttled(delay)
+        elif status < 400:
+            bucket.succeeded()
+
+
+def rate_limit_stats() -> Dict:
+    return {"rps": RATE_LIMIT_RPS, "burst": RATE_LIMIT_BURST, "respect_robots": RESPECT_ROBOTS,
+            **_counters, "wait_s": round(_counters["wait_s"], 3)}
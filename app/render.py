@@ -1,11 +1,282 @@
 from __future__ import annotations
 import asyncio
-from typing import List
-from playwright.async_api import async_playwright, Page, Frame
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from playwright.async_api import async_playwright, Browser, Page, Frame, Playwright, Route
+
+from . import metrics
+from .blocklist import get_blocklist
 
 UA = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
       "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
 
+RENDER_BROWSERS = int(os.getenv("RENDER_BROWSERS", "1"))                  # Chromium processes kept warm
+RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY", "4"))            # pages open at once, pool-wide
+RENDER_MAX_PAGES = int(os.getenv("RENDER_MAX_PAGES_PER_BROWSER", "200"))  # recycle after this many pages
+RENDER_FAST = os.getenv("RENDER_FAST", "1") != "0"                        # block heavy resources, early wait
+RENDER_TIMEOUT_MS = int(os.getenv("RENDER_TIMEOUT_MS", "45000"))
+RENDER_QUIET_MS = int(os.getenv("RENDER_QUIET_MS", "600"))                # no new links for this long = loaded
+
+# Never needed to read a[href]; stylesheets stay since layout drives lazy loading
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+# The directory widget loads from here, although its hosts are on BLOCKLIST
+RENDER_ALLOW_HOSTS = ("partnerpage.io",)
+
+BLOCKLIST = get_blocklist()
+
+
+class _PooledBrowser:
+    def __init__(self, browser: Browser) -> None:
+        self.browser = browser
+        self.served = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """Long-lived Chromium instances handing out a fresh context per page.
+
+    Browsers are launched lazily, retired after ``max_pages`` pages or when
+    they disconnect, and closed once their last page is released.
+    """
+
+    def __init__(self, size: int = RENDER_BROWSERS, concurrency: int = RENDER_CONCURRENCY,
+                 max_pages: int = RENDER_MAX_PAGES) -> None:
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pw: Optional[Playwright] = None
+        self._browsers: List[_PooledBrowser] = []
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._lock = asyncio.Lock()
+        self._counters = {"launched": 0, "recycled": 0, "crashed": 0, "pages": 0, "errors": 0}
+        self._concurrency = max(1, concurrency)
+
+    async def start(self) -> None:
+        self._pw = await async_playwright().start()
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        for rec in self._browsers:
+            try:
+                await rec.browser.close()
+            except Exception:
+                pass
+        self._browsers = []
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+        self.loop = None
+
+    async def _launch(self) -> _PooledBrowser:
+        browser = await self._pw.chromium.launch(args=["--no-sandbox"])
+        rec = _PooledBrowser(browser)
+
+        def on_disconnect(_):
+            if not rec.retired:
+                rec.retired = True
+                self._counters["crashed"] += 1
+        browser.on("disconnected", on_disconnect)
+        self._counters["launched"] += 1
+        return rec
+
+    async def _acquire(self) -> _PooledBrowser:
+        async with self._lock:
+            for rec in self._browsers:
+                if not rec.retired and rec.served >= self.max_pages:
+                    rec.retired = True
+                    self._counters["recycled"] += 1
+            await self._reap()
+            live = [r for r in self._browsers if not r.retired]
+            if len(live) < self.size:
+                rec = await self._launch()
+                self._browsers.append(rec)
+            else:
+                rec = min(live, key=lambda r: r.active)
+            rec.served += 1
+            rec.active += 1
+            return rec
+
+    async def _reap(self) -> None:
+        for rec in [r for r in self._browsers if r.retired and r.active == 0]:
+            self._browsers.remove(rec)
+            try:
+                await rec.browser.close()
+            except Exception:
+                pass
+
+    async def _release(self, rec: _PooledBrowser) -> None:
+        async with self._lock:
+            rec.active -= 1
+            await self._reap()
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        async with self._sem:
+            rec = await self._acquire()
+            context = None
+            try:
+                context = await rec.browser.new_context(user_agent=UA, locale="en-US")
+                page = await context.new_page()
+                self._counters["pages"] += 1
+                yield page
+            except Exception:
+                self._counters["errors"] += 1
+                if not rec.browser.is_connected():
+                    rec.retired = True
+                raise
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                await self._release(rec)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._pw is not None,
+            "browsers": len([r for r in self._browsers if not r.retired]),
+            "retiring": len([r for r in self._browsers if r.retired]),
+            "pages_in_use": sum(r.active for r in self._browsers),
+            "concurrency": self._concurrency,
+            "max_pages_per_browser": self.max_pages,
+            **self._counters,
+        }
+
+
+_pool: Optional[BrowserPool] = None
+
+
+async def start_pool() -> BrowserPool:
+    global _pool
+    if _pool is None:
+        pool = BrowserPool()
+        await pool.start()
+        _pool = pool
+    return _pool
+
+
+async def stop_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.stop()
+
+
+def pool_stats() -> Dict:
+    return _pool.stats() if _pool is not None else {"running": False}
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+@asynccontextmanager
+async def _page() -> AsyncIterator[Page]:
+    # Use the app's pool when we are on its loop; otherwise (CLI) a one-off pool
+    if _pool is not None and _pool.loop is _running_loop():
+        async with _pool.page() as page:
+            yield page
+        return
+    pool = BrowserPool(size=1, concurrency=1)
+    await pool.start()
+    try:
+        async with pool.page() as page:
+            yield page
+    finally:
+        await pool.stop()
+
+
+def _suffixes(host: str) -> Set[str]:
+    # "a.b.example.com" -> {"a.b.example.com", "b.example.com", "example.com"}
+    parts = host.split(".")
+    return {".".join(parts[i:]) for i in range(len(parts) - 1)}
+
+
+async def _block_requests(page: Page, url: str) -> Dict[str, int]:
+    """Abort heavy resources and tracker/platform hosts; returns live counts."""
+    counts = {"requests": 0, "blocked": 0}
+    # The page's own site (e.g. n8n.io for experts.n8n.io) is on BLOCKLIST
+    # as a link target but must still load here.
+    exempt = _suffixes(urlsplit(url).hostname or "") | set(RENDER_ALLOW_HOSTS)
+
+    async def handle(route: Route) -> None:
+        req = route.request
+        counts["requests"] += 1
+        host = urlsplit(req.url).hostname or ""
+        try:
+            if req.resource_type in BLOCKED_RESOURCE_TYPES or (
+                host in BLOCKLIST and not _suffixes(host) & exempt
+            ):
+                counts["blocked"] += 1
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception:
+            pass  # page closed while the request was in flight
+
+    await page.route("**/*", handle)
+    return counts
+
+
+# Runs inside a frame: keeps scrolling to the bottom while a MutationObserver
+# timestamps every insertion that brings new links, and resolves once no
+# links have arrived for ``quiet`` ms or once ``budget`` ms have passed. A
+# frame with no links (trackers, empty iframes) settles once nothing at all
+# has been inserted for ``quiet`` ms, so a shell still rendering keeps waiting.
+_SETTLE_JS = """
+async ({budget, quiet, tick}) => {
+  const t0 = performance.now();
+  const root = document.documentElement;
+  const count = () => document.querySelectorAll('a[href]').length;
+  let lastChange = t0, lastInsert = t0, scrolls = 0, height = -1;
+  const obs = new MutationObserver(muts => {
+    for (const m of muts) for (const n of m.addedNodes) {
+      if (n.nodeType === 1) lastInsert = performance.now();
+      if (n.nodeType === 1 && (n.tagName === 'A' || n.querySelector('a[href]'))) {
+        lastChange = performance.now();
+        return;
+      }
+    }
+  });
+  if (root) obs.observe(root, {childList: true, subtree: true});
+  let plateaued = false;
+  try {
+    while (performance.now() - t0 < budget) {
+      const h = document.body ? document.body.scrollHeight : 0;
+      if (h !== height) { height = h; window.scrollTo(0, h); scrolls++; }
+      await new Promise(r => setTimeout(r, tick));
+      const since = count() > 0 ? lastChange : Math.max(lastChange, lastInsert);
+      if (performance.now() - since >= quiet) { plateaued = true; break; }
+    }
+  } finally {
+    obs.disconnect();
+  }
+  return {anchors: count(), scrolls, plateaued,
+          settle_ms: Math.round(performance.now() - t0),
+          last_link_ms: Math.round(lastChange - t0)};
+}
+"""
+
+
+async def _settle(frame: Frame, budget_ms: int) -> Dict:
+    """Scroll ``frame`` until its link count plateaus; never longer than ``budget_ms``."""
+    try:
+        return await frame.evaluate(
+            _SETTLE_JS, {"budget": max(0, budget_ms), "quiet": RENDER_QUIET_MS, "tick": 100}
+        )
+    except Exception:
+        # Detached or cross-origin-navigated frame: collect what is there
+        return {"anchors": 0, "scrolls": 0, "plateaued": False, "settle_ms": 0, "last_link_ms": 0}
+
+
 async def _auto_scroll(page: Page, max_steps: int = 25, pause_ms: int = 250) -> None:
     last = 0
     for _ in range(max_steps):
@@ -15,49 +286,101 @@ async def _auto_scroll(page: Page, max_steps: int = 25, pause_ms: int = 250) ->
         await page.evaluate("() => window.scrollTo(0, document.body.scrollHeight)")
         await page.wait_for_timeout(pause_ms)
 
+
+async def _load(page: Page, url: str, wait_ms: int, fast: bool) -> Dict:
+    """Navigate and let the page settle.
+
+    Fast mode blocks resources we never read, waits for DOMContentLoaded and
+    then scrolls until the link count plateaus, with ``wait_ms`` as the
+    cap; full mode waits for network idle and then a fixed ``wait_ms``.
+    """
+    stats: Dict = {"mode": "fast" if fast else "full"}
+    started = time.perf_counter()
+    if fast:
+        counts = await _block_requests(page, url)
+        await page.goto(url, wait_until="domcontentloaded", timeout=RENDER_TIMEOUT_MS)
+        stats["goto_ms"] = round((time.perf_counter() - started) * 1000)
+        stats.update(await _settle(page.main_frame, wait_ms))
+        stats["counts"] = counts  # live; merged by the caller once done
+    else:
+        await page.goto(url, wait_until="networkidle", timeout=RENDER_TIMEOUT_MS)
+        stats["goto_ms"] = round((time.perf_counter() - started) * 1000)
+        await _auto_scroll(page)
+        if wait_ms: await page.wait_for_timeout(wait_ms)
+    return stats
+
 async def _frame_hrefs(frame: Frame) -> List[str]:
     try:
         return await frame.evaluate("Array.from(document.querySelectorAll('a[href]')).map(a => a.href)") or []
     except Exception:
         return []
 
-async def render_collect_hrefs_allframes(url: str, wait_ms: int = 1800) -> List[str]:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(args=["--no-sandbox"])
-        context = await browser.new_context(user_agent=UA, locale="en-US")
-        page = await context.new_page()
-        await page.goto(url, wait_until="networkidle", timeout=45000)
-        await _auto_scroll(page)
-        if wait_ms: await page.wait_for_timeout(wait_ms)
-
-        hrefs = await _frame_hrefs(page.main_frame)
-        for fr in page.frames:
-            if fr is page.main_frame: continue
+async def _frames_fixed(page: Page) -> List[str]:
+    hrefs: List[str] = []
+    for fr in page.frames:
+        if fr is page.main_frame: continue
+        try:
             try:
-                try:
-                    await fr.evaluate("() => window.scrollTo(0, document.body.scrollHeight)")
-                    await page.wait_for_timeout(200)
-                except Exception:
-                    pass
-                hrefs.extend(await _frame_hrefs(fr))
+                await fr.evaluate("() => window.scrollTo(0, document.body.scrollHeight)")
+                await page.wait_for_timeout(200)
             except Exception:
-                continue
+                pass
+            hrefs.extend(await _frame_hrefs(fr))
+        except Exception:
+            continue
+    return hrefs
 
-        await browser.close()
-        return hrefs
+async def _frames_settled(page: Page, budget_ms: int) -> Tuple[List[str], Dict]:
+    # All iframes settle concurrently within what is left of the budget
+    frames = [fr for fr in page.frames if fr is not page.main_frame]
+    if not frames:
+        return [], {"frames": 0}
+    settled = await asyncio.gather(*(_settle(fr, budget_ms) for fr in frames))
+    hrefs: List[str] = []
+    for fr in frames:
+        hrefs.extend(await _frame_hrefs(fr))
+    return hrefs, {
+        "frames": len(frames),
+        "frames_settle_ms": max(s["settle_ms"] for s in settled),
+        "frames_plateaued": sum(1 for s in settled if s["plateaued"]),
+    }
 
-async def render_html(url: str, wait_ms: int = 1500) -> str:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(args=["--no-sandbox"])
-        context = await browser.new_context(user_agent=UA, locale="en-US")
-        page = await context.new_page()
-        await page.goto(url, wait_until="networkidle", timeout=45000)
-        await _auto_scroll(page)
-        if wait_ms: await page.wait_for_timeout(wait_ms)
-        html = await page.content()
-        await browser.close()
-        return html
+async def render_collect_hrefs_with_stats(url: str, wait_ms: int = 1800,
+                                          fast: Optional[bool] = None) -> Tuple[List[str], Dict]:
+    """Hrefs from the page and its iframes, plus render stats.
+
+    In fast mode ``wait_ms`` caps the whole settle phase: the main frame
+    first, then the iframes share what remains (at least ``RENDER_QUIET_MS``).
+    """
+    started = time.perf_counter()
+    fast = RENDER_FAST if fast is None else fast
+    with metrics.timed("render"):
+        async with _page() as page:
+            stats = await _load(page, url, wait_ms, fast)
+            hrefs = await _frame_hrefs(page.main_frame)
+            if fast:
+                left = wait_ms - stats["settle_ms"]
+                frame_hrefs, frame_stats = await _frames_settled(page, max(RENDER_QUIET_MS, left))
+                stats.update(frame_stats)
+                stats.update(stats.pop("counts"))
+            else:
+                frame_hrefs = await _frames_fixed(page)
+            hrefs.extend(frame_hrefs)
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000)
+    return hrefs, stats
+
+async def render_collect_hrefs_allframes(url: str, wait_ms: int = 1800, fast: Optional[bool] = None) -> List[str]:
+    hrefs, _ = await render_collect_hrefs_with_stats(url, wait_ms, fast)
+    return hrefs
+
+async def render_html(url: str, wait_ms: int = 1500, fast: Optional[bool] = None) -> str:
+    with metrics.timed("render"):
+        async with _page() as page:
+            await _load(page, url, wait_ms, RENDER_FAST if fast is None else fast)
+            return await page.content()
 
+# Sync entry points for CLI use; the app awaits the coroutines above on its
+# own loop so renders never occupy a threadpool worker.
 def render_collect_hrefs_sync(url: str, wait_ms: int = 1800):
     return asyncio.run(render_collect_hrefs_allframes(url, wait_ms))
 
@@ -1,134 +1,201 @@
-from typing import Dict
-
-
-def _score_by_keywords(text: str, keywords: Dict[str, int]) -> int:
-    t = text.lower()
-    score = 0
-    for kw, pts in keywords.items():
-        if kw in t:
-            score += pts
-    return score
-
-
-def score_signals(text: str) -> Dict:
-    t = text.lower()
-
-    size = _score_by_keywords(
-        t,
-        {
-            "careers": 6,
-            "hiring": 5,
-            "global": 4,
-            "offices": 4,
-            "100+": 3,
-            "200+": 3,
-            "employees": 2,
-        },
-    )
-    size = min(size, 25)
-
-    enterprise = _score_by_keywords(
-        t,
-        {
-            "soc2": 6,
-            "iso27001": 6,
-            "sso": 3,
-            "saml": 3,
-            "okta": 2,
-            "azure ad": 2,
-            "sla": 2,
-            "slas": 2,
-            "siem": 2,
-            "kubernetes": 2,
-            "k8s": 2,
-            "snowflake": 2,
-            "databricks": 2,
-            "terraform": 2,
-        },
-    )
-    enterprise = min(enterprise, 25)
-
-    tech = _score_by_keywords(
-        t,
-        {
-            "kafka": 4,
-            "dbt": 3,
-            "airflow": 3,
-            "snowflake": 3,
-            "llm": 3,
-            "rag": 2,
-            "agent": 2,
-            "orchestration": 2,
-            "aws": 2,
-            "gcp": 2,
-            "azure": 2,
-        },
-    )
-    tech = min(tech, 15)
-
-    regulated = _score_by_keywords(
-        t,
-        {
-            "healthcare": 3,
-            "hipaa": 3,
-            "fintech": 3,
-            "banking": 3,
-            "insurance": 3,
-            "pharma": 3,
-            "government": 3,
-            "industrial": 2,
-            "manufacturing": 2,
-        },
-    )
-    regulated = min(regulated, 15)
-
-    delivery = _score_by_keywords(
-        t,
-        {
-            "statement of work": 3,
-            "sow": 3,
-            "managed services": 4,
-            "24/7": 3,
-            "24x7": 3,
-            "support": 2,
-            "sla": 2,
-            "msp": 2,
-        },
-    )
-    delivery = min(delivery, 15)
-
-    marketing = _score_by_keywords(
-        t,
-        {
-            "case studies": 4,
-            "whitepaper": 3,
-            "whitepapers": 3,
-            "ebook": 2,
-            "webinar": 2,
-            "roi": 1,
-        },
-    )
-    marketing = min(marketing, 10)
-
-    total = size + enterprise + tech + regulated + delivery + marketing
-    if total >= 70:
-        tier = "Enterprise"
-    elif total >= 50:
-        tier = "Mid-market"
+"""Keyword scoring of partner text.
+
+Weights, caps and tier thresholds live in a rules file (JSON, or YAML when
+PyYAML is installed): ``SCORING_RULES_PATH``, defaulting to the bundled
+``scoring_rules.json``. Rules are compiled once into a single-pass matcher
+and can be swapped at runtime with ``reload_rules``.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+
+SCORING_RULES_PATH = os.getenv(
+    "SCORING_RULES_PATH", os.path.join(os.path.dirname(__file__), "scoring_rules.json")
+)
+
+
+def _bounded(alternation: str) -> str:
+    # Keywords must not be glued to letters/digits on either side, so "rag"
+    # does not fire inside "storage"; works for "24/7" and "100+" too.
+    return rf"(?<![a-z0-9])(?:{alternation})(?![a-z0-9])"
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Alternation with shared prefixes factored out ("sla", "slas", "sso"
+    become ``s(?:la(?:s)?|so)``), so the engine walks each position once."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+def _compile(categories: List[Tuple[str, int, Dict[str, int]]]):
+    keywords = sorted({kw for _, _, kws in categories for kw in kws})
+    # Anchoring on a leading separator (the text is scanned with a space
+    # prepended) lets the engine skip ahead to candidate word starts instead
+    # of evaluating a lookbehind at every position. The trie is greedy, so
+    # "azure ad" wins over "azure" at the same position.
+    pattern = re.compile(rf"[^a-z0-9]({_trie_regex(keywords)})(?![a-z0-9])")
+    # A match consumes its span, so keywords contained in a longer one
+    # ("azure" in "azure ad") are credited through this table instead.
+    implied = {
+        kw: [o for o in keywords if o != kw and re.search(_bounded(re.escape(o)), kw)]
+        for kw in keywords
+    }
+    return pattern, implied
+
+
+def _version(data: Dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class Rules:
+    """A compiled rules file: categories, tier thresholds and the matcher."""
+
+    def __init__(self, data: Dict, source: str = "<inline>") -> None:
+        try:
+            # (component, cap, {keyword: points})
+            self.categories: List[Tuple[str, int, Dict[str, int]]] = [
+                (str(c["name"]), int(c["cap"]),
+                 {str(k).lower(): int(v) for k, v in c["keywords"].items()})
+                for c in data["categories"]
+            ]
+            # Highest threshold first
+            self.tiers: List[Tuple[str, int]] = sorted(
+                ((str(t["name"]), int(t["min_total"])) for t in data.get("tiers", [])),
+                key=lambda t: -t[1],
+            )
+            self.default_tier = str(data.get("default_tier", "SMB"))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"invalid scoring rules in {source}: {e!r}") from e
+        if not self.categories:
+            raise ValueError(f"invalid scoring rules in {source}: no categories")
+        self.source = source
+        self.version = _version(data)
+        self._data = data
+        self._pattern, self._implied = _compile(self.categories)
+
+    def __reduce__(self):
+        # Sent to CPU workers as raw data; they compile each version once
+        return _unpickle_rules, (self._data, self.source)
+
+    def match_keywords(self, text: str) -> Set[str]:
+        """All keywords present in ``text``, found in a single regex scan."""
+        found: Set[str] = set()
+        for kw in self._pattern.findall(" " + text.lower()):
+            if kw not in found:
+                found.add(kw)
+                found.update(self._implied[kw])
+        return found
+
+    @property
+    def tier_names(self) -> List[str]:
+        """Every tier a partner can land in, highest first."""
+        names = [name for name, _ in self.tiers]
+        return names + [self.default_tier] if self.default_tier not in names else names
+
+    def tier_for(self, total: int) -> str:
+        for name, min_total in self.tiers:
+            if total >= min_total:
+                return name
+        return self.default_tier
+
+    def summary(self) -> Dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "categories": {name: {"cap": cap, "keywords": len(kws)} for name, cap, kws in self.categories},
+            "tiers": dict(self.tiers),
+            "default_tier": self.default_tier,
+        }
+
+
+_unpickled: Dict[str, Rules] = {}
+
+
+def _unpickle_rules(data: Dict, source: str) -> Rules:
+    version = _version(data)
+    rules = _unpickled.get(version)
+    if rules is None:
+        if len(_unpickled) >= 4:
+            _unpickled.clear()
+        rules = _unpickled[version] = Rules(data, source)
+    return rules
+
+
+def load_rules(path: str) -> Rules:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as e:
+            raise RuntimeError("PyYAML is required for YAML scoring rules") from e
+        data = yaml.safe_load(raw)
     else:
-        tier = "SMB"
+        data = json.loads(raw)
+    return Rules(data, source=path)
 
-    return {
-        "tier": tier,
-        "total": total,
-        "components": {
-            "size_signals": size,
-            "enterprise_security": enterprise,
-            "tech_stack": tech,
-            "regulated_verticals": regulated,
-            "delivery_maturity": delivery,
-            "marketing_assets": marketing,
-        },
+
+_rules = load_rules(SCORING_RULES_PATH)
+_rules_lock = threading.Lock()
+
+
+def get_rules() -> Rules:
+    return _rules
+
+
+def reload_rules(path: Optional[str] = None) -> Rules:
+    """Load and compile ``path`` (default: the current source) and swap it in.
+
+    If loading fails the exception propagates and the old rules stay active.
+    """
+    global _rules
+    with _rules_lock:
+        rules = load_rules(path or _rules.source)
+        _rules = rules
+    return rules
+
+
+def match_keywords(text: str) -> Set[str]:
+    return _rules.match_keywords(text)
+
+
+def category_hits(text: str, rules: Optional[Rules] = None) -> Dict[str, List[str]]:
+    rules = rules or _rules
+    found = rules.match_keywords(text)
+    return {name: sorted(kw for kw in kws if kw in found) for name, _, kws in rules.categories}
+
+
+def score_signals(text: str, rules: Optional[Rules] = None) -> Dict:
+    rules = rules or _rules
+    hits = category_hits(text, rules)
+    components = {
+        name: min(sum(kws[kw] for kw in hits[name]), cap)
+        for name, cap, kws in rules.categories
     }
 
+    total = sum(components.values())
 
+    return {
+        "tier": rules.tier_for(total),
+        "total": total,
+        "components": components,
+        "hits": hits,
+        "rules_version": rules.version,
+    }
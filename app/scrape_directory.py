@@ -1,11 +1,18 @@
-import time
+import logging
+import os
+from functools import lru_cache
 from typing import Iterable, List, Optional, Tuple
 from urllib.parse import urlparse
-import requests
-from bs4 import BeautifulSoup
-import tldextract
 from collections import Counter
 
+from . import http_client, metrics
+from .blocklist import _extract, get_blocklist
+from .html_parse import iter_links
+
+logger = logging.getLogger(__name__)
+
+NORM_CACHE_SIZE = int(os.getenv("NORM_CACHE_SIZE", "65536"))  # hostnames memoised by _host_to_domain
+
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; MotivoScraper/1.0; +https://getmotivo.ai)"}
 
 ALLOWLIST = {
@@ -17,25 +24,8 @@ ALLOWLIST = {
     "truehorizon.ai","wotai.ai",
 }
 
-BLOCKLIST = {
-    "experts.n8n.io","n8n.io","n8n.cloud","vercel.app","cloudflare.com","gstatic.com",
-    "x.com","twitter.com","linkedin.com","facebook.com","instagram.com","youtube.com",
-    "tiktok.com","reddit.com","discord.com","discord.gg","github.com","gitlab.com",
-    "posthog.com","google-analytics.com","analytics.google.com","doubleclick.net",
-    "cookie-script.com","hotjar.com","clarity.ms","safety.google","googletagmanager.com",
-    "intercom.com","crisp.chat","freshdesk.com","zendesk.com",
-    "paddle.com","stripe.com","lu.ma","cal.com","calendly.com",
-    "medium.com","wordpress.org","ghost.org","substack.com","read.cv",
-    "adobe.com","amazon.com","aws.amazon.com","microsoft.com","azure.com",
-    "google.com","webflow.com","shopify.com","typeform.com","airtable.com",
-    "notion.so","notion.site","slack.com","zapier.com","make.com","workato.com",
-    "segment.com","hubspot.com","salesforce.com",
-    "flickr.com","dropbox.com","drive.google.com","box.com",
-    # Additional platform/infra/common CDNs
-    "cdn.partnerpage.io","js.partnerpage.io","assets.partnerpage.io","content.partnerpage.io",
-    "admin.partnerpage.io","mixpanel.com","sentry.io","fontawesome.com","gstatic.com",
-    "fonts.googleapis.com","fonts.gstatic.com"
-}
+# Trackers, platforms and CDNs; rules live in blocklist.txt (see blocklist.py)
+BLOCKLIST = get_blocklist()
 
 def _host(url_or_host: str) -> Optional[str]:
     if not url_or_host or url_or_host.startswith(("mailto:", "tel:")):
@@ -44,15 +34,24 @@ def _host(url_or_host: str) -> Optional[str]:
     host = (parsed.netloc or parsed.path).split(":")[0].lower().strip(".")
     return host or None
 
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def _host_to_domain(host: str) -> Optional[str]:
+    # Most links point at a few hosts, and listed ones (known partners,
+    # then trackers/platforms) are settled before any suffix extraction.
+    # ALLOWLIST wins over the blocklist.
+    labels = host.split(".")
+    for i in range(len(labels) - 1):
+        parent = ".".join(labels[i:])
+        if parent in ALLOWLIST: return parent
+    if host in BLOCKLIST: return None
+    ext = _extract(host)
+    if not ext.domain or not ext.suffix: return None
+    return f"{ext.domain}.{ext.suffix}"
+
 def _norm_to_domain(url_or_host: str) -> Optional[str]:
     h = _host(url_or_host)
     if not h: return None
-    ext = tldextract.extract(h)
-    if not ext.domain or not ext.suffix: return None
-    domain = f"{ext.domain}.{ext.suffix}"
-    if domain in ALLOWLIST: return domain
-    if domain in BLOCKLIST: return None
-    return domain
+    return _host_to_domain(h)
 
 def _from_hrefs(hrefs: Iterable[str], directory_host: str) -> Tuple[List[str], List[str]]:
     raw_hosts = []
@@ -63,17 +62,15 @@ def _from_hrefs(hrefs: Iterable[str], directory_host: str) -> Tuple[List[str], L
         raw_hosts.append(h)
         if h == directory_host:  # internal links to experts portal
             continue
-        d = _norm_to_domain(href)
+        d = _host_to_domain(h)
         if d:
             found.add(d)
     return sorted(found), raw_hosts
 
-def fetch_html(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    return r.text
+async def fetch_html(url: str) -> str:
+    return await http_client.get_text(url, headers=HEADERS)
 
-def scrape_directory(
+async def scrape_directory(
     urls: List[str],
     use_js: bool = False,
     renderer=None,
@@ -81,6 +78,11 @@ def scrape_directory(
     wait_ms: int = 1500,
     directory_host: Optional[str] = None,
 ):
+    """Collect partner domains linked from directory ``urls``.
+
+    ``renderer_hrefs`` is an async ``(url, wait_ms) -> hrefs`` callable used
+    when ``use_js`` is set; otherwise the static HTML is fetched.
+    """
     all_domains = set()
     raw_hosts_all: List[str] = []
     mode = "html"
@@ -91,24 +93,29 @@ def scrape_directory(
     for u in urls:
         try:
             if use_js and renderer_hrefs:
-                hrefs = renderer_hrefs(u, wait_ms)
+                await http_client.throttle(u)
+                hrefs = await renderer_hrefs(u, wait_ms)
                 domains, raw_hosts = _from_hrefs(hrefs, directory_host)
                 mode = "js-hrefs"
             else:
-                html = fetch_html(u)
+                html = await fetch_html(u)
                 # HTML fallback (rare for this page)
                 domains, raw_hosts = _from_hrefs(
-                    [a.get("href","") for a in BeautifulSoup(html, "html.parser").select("a[href]")],
+                    [href for href, _ in iter_links(html)],
                     directory_host
                 )
                 mode = "html"
 
             raw_hosts_all.extend(raw_hosts)
             all_domains.update(domains)
-            time.sleep(0.4)
         except Exception as e:
-            print(f"[scrape_directory] Error on {u}: {e}")
+            metrics.error("directory_scrape", _host(u) or "", e)
+            logger.warning("Directory scrape failed for %s: %s", u, e)
             continue
 
     top_hosts = [f"{h}:{c}" for h, c in Counter(raw_hosts_all).most_common(12)]
     return sorted(all_domains), mode, top_hosts
+
+def scrape_directory_sync(urls: List[str], **kwargs):
+    # CLI entry point; the app awaits scrape_directory directly
+    return http_client.run_sync(scrape_directory(urls, **kwargs))
@@ -1,56 +1,60 @@
-from typing import List, Optional, Set, Tuple
-from urllib.parse import urljoin
+"""Directory crawl: listing pages -> profile slugs -> partner domains.
 
-import requests
-from bs4 import BeautifulSoup
+Listing pages are fetched concurrently and feed their slugs straight into a
+pool of profile workers, so profiles are fetched while later listing pages
+are still loading. The crawl stops as soon as ``limit_profiles`` unique
+domains are known.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional, Set
+from urllib.parse import urljoin, urlsplit
 
-from .scrape_directory import HEADERS, _norm_to_domain
+from . import http_client, metrics
+from .html_parse import iter_links
+from .scrape_directory import BLOCKLIST, HEADERS, _host, _norm_to_domain
 
 
-def _discover_profile_slugs(directory_url: str, max_pages: int = 3) -> List[str]:
-    slugs: Set[str] = set()
-    base = directory_url.rstrip("/")
-    pages = [base]
-    # The experts directory paginates with ?page=2, ?page=3...
-    for p in range(2, max_pages + 1):
-        pages.append(f"{base}?page={p}")
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))    # profile fetches in flight
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))  # politeness cap per host, listing + profiles
 
-    for page_url in pages:
-        try:
-            r = requests.get(page_url, headers=HEADERS, timeout=30)
-            r.raise_for_status()
-        except Exception:
+
+def _listing_slugs(html: str) -> List[str]:
+    slugs: Set[str] = set()
+    for href, _ in iter_links(html):
+        if not href or href.startswith("http"):
             continue
-        soup = BeautifulSoup(r.text, "html.parser")
-        for a in soup.select("a[href]"):
-            href = a.get("href") or ""
-            if not href or href.startswith("http"):
-                continue
-            if href.count("/") == 1 and href.startswith("/"):
-                # Looks like /<slug>
-                slug = href.strip("/")
-                if slug and slug not in ("contact", "review"):
-                    slugs.add(slug)
+        if href.count("/") == 1 and href.startswith("/"):
+            # Looks like /<slug>
+            slug = href.strip("/")
+            if slug and slug not in ("contact", "review"):
+                slugs.add(slug)
     return sorted(slugs)
 
 
-def _extract_domain_from_profile(profile_url: str) -> Optional[str]:
-    r = requests.get(profile_url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+def _error(url: str, stage: str, e: Exception) -> Dict:
+    metrics.error(f"crawl_{stage}", metrics.host_of(url), e)
+    msg = str(e).splitlines()[0] if str(e) else ""
+    return {"url": url, "stage": stage, "error": f"{type(e).__name__}: {msg}"}
+
+
+async def _extract_domain_from_profile(profile_url: str) -> Optional[str]:
+    html = await http_client.get_text(profile_url, headers=HEADERS)
+    links = list(iter_links(html))
 
     # Prefer explicit "View website" anchor
-    for a in soup.select("a[href]"):
-        txt = (a.get_text() or "").strip().lower()
-        if "view website" in txt:
-            d = _norm_to_domain(a.get("href") or "")
+    for href, txt in links:
+        if "view website" in txt.strip().lower():
+            d = _norm_to_domain(href)
             if d:
                 return d
 
-    # Fallback: any external http link not on experts.n8n.io
-    for a in soup.select("a[href^='http']"):
-        href = a.get("href") or ""
-        if "experts.n8n.io" in href:
+    # Fallback: any external http link not on the directory or a blocked host
+    for href, _ in links:
+        if not href.startswith("http"):
+            continue
+        host = _host(href)
+        if not host or host in BLOCKLIST:
             continue
         d = _norm_to_domain(href)
         if d:
@@ -58,25 +62,111 @@ def _extract_domain_from_profile(profile_url: str) -> Optional[str]:
     return None
 
 
-def crawl_directory(directory_url: str, limit_profiles: int = 100) -> List[str]:
-    slugs = _discover_profile_slugs(directory_url, max_pages=5)
-    if not slugs:
-        return []
+async def crawl_directory_report(
+    directory_url: str,
+    limit_profiles: int = 100,
+    max_pages: int = 5,
+    workers: int = CRAWL_WORKERS,
+    per_host: int = CRAWL_PER_HOST,
+) -> Dict:
+    """Crawl the directory and report what happened.
+
+    Returns ``domains`` (sorted), ``profiles_scanned``, ``stopped_early``,
+    one entry per listing page in ``pages`` (slugs found, or its error) and
+    every failed fetch in ``errors``.
+    """
     base = directory_url.rstrip("/")
-    found: List[str] = []
-    seen: Set[str] = set()
-    for slug in slugs[: max(1, limit_profiles)]:
-        profile_url = urljoin(base + "/", slug)
+    # The experts directory paginates with ?page=2, ?page=3...
+    listing_urls = [base] + [f"{base}?page={p}" for p in range(2, max_pages + 1)]
+    limit = max(1, limit_profiles)
+    n_workers = max(1, workers)
+
+    hosts: Dict[str, asyncio.Semaphore] = {}
+
+    def slot(url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        if host not in hosts:
+            hosts[host] = asyncio.Semaphore(max(1, per_host))
+        return hosts[host]
+
+    queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    queued: Set[str] = set()
+    pages: List[Dict] = []
+    errors: List[Dict] = []
+    found: Set[str] = set()
+    enough = asyncio.Event()
+    scanned = 0
+
+    async def listing(url: str) -> None:
         try:
-            domain = _extract_domain_from_profile(profile_url)
-        except Exception:
-            domain = None
-        if not domain:
-            continue
-        if domain in seen:
-            continue
-        seen.add(domain)
-        found.append(domain)
-    return sorted(found)
+            async with slot(url):
+                html = await http_client.get_text(url, headers=HEADERS)
+        except Exception as e:
+            err = _error(url, "listing", e)
+            errors.append(err)
+            pages.append({"url": url, "slugs": 0, "error": err["error"]})
+            return
+        new = [s for s in _listing_slugs(html) if s not in queued]
+        for slug in new:
+            queued.add(slug)
+            queue.put_nowait(slug)
+        pages.append({"url": url, "slugs": len(new)})
+
+    async def listings() -> None:
+        await asyncio.gather(*(listing(u) for u in listing_urls))
+        for _ in range(n_workers):
+            queue.put_nowait(None)  # no more slugs
+
+    async def worker() -> None:
+        nonlocal scanned
+        while True:
+            slug = await queue.get()
+            if slug is None:
+                return
+            profile_url = urljoin(base + "/", slug)
+            try:
+                async with slot(profile_url):
+                    with metrics.timed("profile_resolve"):
+                        domain = await _extract_domain_from_profile(profile_url)
+            except Exception as e:
+                errors.append(_error(profile_url, "profile", e))
+                continue
+            scanned += 1
+            if enough.is_set():
+                return  # another worker reached the limit first
+            if domain and domain not in found:
+                found.add(domain)
+                if len(found) >= limit:
+                    enough.set()
+                    return
+
+    async def drain() -> None:
+        await asyncio.gather(*(worker() for _ in range(n_workers)))
+
+    tasks = [asyncio.create_task(listings()), asyncio.create_task(drain()),
+             asyncio.create_task(enough.wait())]
+    try:
+        # Done when every slug is processed or the limit is reached
+        await asyncio.wait(tasks[1:], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    order = {u: i for i, u in enumerate(listing_urls)}
+    return {
+        "domains": sorted(found),
+        "profiles_scanned": scanned,
+        "stopped_early": enough.is_set(),
+        "pages": sorted(pages, key=lambda p: order[p["url"]]),
+        "errors": errors,
+    }
+
+
+async def crawl_directory(directory_url: str, limit_profiles: int = 100) -> List[str]:
+    report = await crawl_directory_report(directory_url, limit_profiles=limit_profiles)
+    return report["domains"]
 
 
+def crawl_directory_sync(directory_url: str, limit_profiles: int = 100) -> List[str]:
+    return http_client.run_sync(crawl_directory(directory_url, limit_profiles))
@@ -1,17 +1,37 @@
-import json
-from typing import List, Dict, Optional, Tuple
+import asyncio
+import os
+from typing import List, Dict, Optional, Tuple, Union
 from urllib.parse import urlencode, urlparse, parse_qs
 
-import requests
-from bs4 import BeautifulSoup
+import httpx
 
-from .scrape_directory import HEADERS, _norm_to_domain, ALLOWLIST
+from . import http_client, metrics
+from .html_parse import iter_links
+from .scrape_directory import ALLOWLIST, BLOCKLIST, HEADERS, _host, _norm_to_domain
 
 
 DIRECTORY_UUID = "3cc2eccc-f4f5-40b5-aa94-310ebb352941"
 ADMIN_BASE = "https://admin.partnerpage.io"
 SEARCH_PATH = "/search/directory_vendor/service_partners/{uuid}/"
 SITE_BASE = "https://experts.n8n.io"
+PROFILE_CONCURRENCY = int(os.getenv("PROFILE_CONCURRENCY", "8"))
+FEED_CONCURRENCY = int(os.getenv("FEED_CONCURRENCY", "4"))
+FEED_MAX_PAGES = int(os.getenv("FEED_MAX_PAGES", "50"))  # guard against a runaway next chain
+
+# Canonicalization for deterministic outputs (normalize alternate TLDs)
+CANONICAL_DOMAIN_MAP = {
+    "agentstudio.io": "agent.studio",
+    "avanai.io": "avanai.com",
+    "atheo.net": "atheo.com",
+    "cloudvox.co": "cloudvox.it",
+    "data4prime.com": "data4prime.it",
+    "dotsandarrows.eu": "dotsandarrows.io",
+    "ed.dev.br": "ed.agency",
+    "goodspeed.studio": "agoodspeed.com",
+    "symplytics.com": "symplytics.ai",
+    "wotai.co": "wotai.ai",
+    "spalatoconsulting.com": "alexandraspalato.com",
+}
 
 
 def _is_admin_feed(url: str) -> bool:
@@ -19,31 +39,25 @@ def _is_admin_feed(url: str) -> bool:
 
 
 def _default_feed_urls() -> List[str]:
-    # API enforces page_size <= 21
-    base_params = {
+    # API enforces page_size <= 21; no page param, so the paginator walks them all
+    params = {
         "availability": "true",
         "ordering": "tier",
         "page_size": "21",
     }
-    urls = []
-    for page in (1, 2):
-        params = base_params | {"page": str(page)}
-        urls.append(
-            f"{ADMIN_BASE}{SEARCH_PATH.format(uuid=DIRECTORY_UUID)}?{urlencode(params)}"
-        )
-    return urls
+    return [f"{ADMIN_BASE}{SEARCH_PATH.format(uuid=DIRECTORY_UUID)}?{urlencode(params)}"]
 
 
 def _guess_feed_urls(url: str) -> List[str]:
     if _is_admin_feed(url):
-        # Respect provided params; if no page param, fetch page 1 then page 2
+        # Respect provided params; an explicit page param means just that page
         parsed = urlparse(url)
         qs = parse_qs(parsed.query)
         if "page" in qs:
             return [url]
         params = dict((k, v[0]) for k, v in qs.items())
         params.setdefault("page_size", "21")
-        return [f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{urlencode(params | {'page': str(p)})}" for p in (1, 2)]
+        return [f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{urlencode(params)}"]
 
     # If experts directory page is provided, switch to admin feed URLs
     if url.startswith(SITE_BASE):
@@ -53,65 +67,161 @@ def _guess_feed_urls(url: str) -> List[str]:
     return [url]
 
 
-def fetch_experts_json(url: str) -> List[Dict]:
-    """Fetch experts JSON records from the admin feed or a custom endpoint.
+def _with_page(url: str, page: int) -> str:
+    parsed = urlparse(url)
+    params = dict((k, v[0]) for k, v in parse_qs(parsed.query).items())
+    return parsed._replace(query=urlencode(params | {"page": str(page)})).geturl()
+
+
+def _page_records(data) -> List[Dict]:
+    # Known schema from admin.partnerpage.io: {"count", "next", "results"}
+    if isinstance(data, dict) and "results" in data:
+        return data.get("results", []) or []
+    if isinstance(data, list):
+        return data
+    return []
+
+
+async def _get_page(url: str):
+    # Feeds change as partners join; always revalidate
+    with metrics.timed("feed_fetch"):
+        return await http_client.get_json(url, headers=HEADERS, ttl_s=0)
+
 
-    Returns a flat list of result dicts. Handles pagination for the known admin feed.
+def _past_end(exc: BaseException) -> bool:
+    # DRF answers 404 for a page beyond the last one
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 404
+
+
+async def fetch_feed(url: str, concurrency: int = FEED_CONCURRENCY) -> List[Dict]:
+    """All records behind a paginated feed URL.
+
+    The first page's ``count`` gives the number of pages, and the rest are
+    fetched concurrently; without a count, ``next`` links are followed one by
+    one. Either way an empty page, or a 404 for a page the directory shrank
+    away from, ends the walk with the records fetched so far. A URL that
+    already names a ``page`` is fetched as that single page.
     """
-    urls = _guess_feed_urls(url)
-    records: List[Dict] = []
-    for u in urls:
-        r = requests.get(u, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        data = r.json() if r.headers.get("content-type", "").startswith("application/json") else json.loads(r.text)
-        # Known schema from admin.partnerpage.io
-        if isinstance(data, dict) and "results" in data:
-            records.extend(data.get("results", []) or [])
-        elif isinstance(data, list):
-            records.extend(data)
+    first = await _get_page(url)
+    records = list(_page_records(first))
+    if not isinstance(first, dict) or not records or "page" in parse_qs(urlparse(url).query):
+        return records
+
+    next_url = first.get("next")
+    count = first.get("count")
+    if isinstance(count, int) and count > len(records):
+        pages = min(FEED_MAX_PAGES, -(-count // len(records)))
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(page: int):
+            async with sem:
+                return await _get_page(_with_page(url, page))
+
+        rest = await asyncio.gather(*(one(p) for p in range(2, pages + 1)), return_exceptions=True)
+        next_url = None
+        for data in rest:
+            if isinstance(data, BaseException):
+                if _past_end(data):
+                    break
+                raise data
+            page_records = _page_records(data)
+            if not page_records:
+                next_url = None
+                break
+            records.extend(page_records)
+            # Set only if the feed grew while we were paging; the loop below picks up the tail
+            next_url = data.get("next") if isinstance(data, dict) else None
+        if pages == FEED_MAX_PAGES:
+            next_url = None
+
+    seen_pages = {url}
+    while next_url and next_url not in seen_pages and len(seen_pages) < FEED_MAX_PAGES:
+        seen_pages.add(next_url)
+        try:
+            data = await _get_page(next_url)
+        except httpx.HTTPStatusError as e:
+            if _past_end(e):
+                break
+            raise
+        page_records = _page_records(data)
+        if not page_records:
+            break
+        records.extend(page_records)
+        next_url = data.get("next") if isinstance(data, dict) else None
     return records
 
 
-def _resolve_website_from_profile(slug: str) -> Optional[str]:
+def _dedupe(records: List[Dict]) -> List[Dict]:
+    # Ordering can shift between page requests, repeating a record at a boundary
+    out: List[Dict] = []
+    seen = set()
+    for rec in records:
+        key = (rec.get("id") or rec.get("slug")) if isinstance(rec, dict) else None
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(rec)
+    return out
+
+
+async def fetch_experts_json(url: str) -> List[Dict]:
+    """Fetch experts JSON records from the admin feed or a custom endpoint.
+
+    Returns a flat list of result dicts, following the feed's pagination.
+    """
+    return await fetch_all_records(_guess_feed_urls(url))
+
+
+async def _resolve_website_from_profile(slug: str) -> Optional[str]:
     url = f"{SITE_BASE}/{slug}"
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    html = await http_client.get_text(url, headers=HEADERS)
+    links = list(iter_links(html))
 
     # Prefer an explicit "View website" link
-    for a in soup.select("a[href]"):
-        txt = (a.get_text() or "").strip().lower()
-        if "view website" in txt:
-            return a.get("href")
-
-    # Fallback: any external-looking http(s) link that is not on experts.n8n.io
-    for a in soup.select("a[href^='http']"):
-        href = a.get("href")
-        if href and "experts.n8n.io" not in href:
+    for href, txt in links:
+        if "view website" in txt.strip().lower():
+            return href
+
+    # Fallback: any external-looking http(s) link not on the directory or a blocked host
+    for href, _ in links:
+        if not href.startswith("http"):
+            continue
+        host = _host(href)
+        if host and host not in BLOCKLIST:
             return href
     return None
 
 
-def extract_domains(records: List[Dict]) -> List[str]:
+async def _resolve_profiles(
+    slugs: List[str], concurrency: int = PROFILE_CONCURRENCY
+) -> Dict[str, Union[str, None, Exception]]:
+    """Resolve profile slugs concurrently, at most ``concurrency`` at a time.
+
+    Returns ``{slug: href}``; a slug whose lookup failed maps to the exception
+    instead, so one bad profile never aborts the batch.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(slug: str) -> Optional[str]:
+        async with sem:
+            try:
+                with metrics.timed("profile_resolve"):
+                    return await _resolve_website_from_profile(slug)
+            except Exception as e:
+                metrics.error("profile_resolve", metrics.host_of(SITE_BASE), e)
+                raise
+
+    unique = list(dict.fromkeys(slugs))
+    results = await asyncio.gather(*(one(s) for s in unique), return_exceptions=True)
+    return dict(zip(unique, results))
+
+
+async def extract_domains(records: List[Dict]) -> List[str]:
     """Extract company domains from records.
 
     The admin feed does not include website URLs directly, so we resolve via profile slug.
     """
-    # Canonicalization for deterministic outputs (normalize alternate TLDs)
-    CANONICAL_DOMAIN_MAP = {
-        "agentstudio.io": "agent.studio",
-        "avanai.io": "avanai.com",
-        "atheo.net": "atheo.com",
-        "cloudvox.co": "cloudvox.it",
-        "data4prime.com": "data4prime.it",
-        "dotsandarrows.eu": "dotsandarrows.io",
-        "ed.dev.br": "ed.agency",
-        "goodspeed.studio": "agoodspeed.com",
-        "symplytics.com": "symplytics.ai",
-        "wotai.co": "wotai.ai",
-        "spalatoconsulting.com": "alexandraspalato.com",
-    }
-
     # If slug exists but website extraction fails or differs, force canonical domain
     SLUG_DOMAIN_OVERRIDES = {
         "makeitfuture": "makeitfuture.com",
@@ -139,6 +249,11 @@ def extract_domains(records: List[Dict]) -> List[str]:
         "wotai": "wotai.ai",
     }
 
+    resolved = await _resolve_profiles([
+        (r.get("slug") or "").strip() for r in records
+        if (r.get("slug") or "").strip() and not (r.get("website") or r.get("url") or "").strip()
+    ])
+
     domains: List[str] = []
     seen = set()
     for rec in records:
@@ -149,9 +264,8 @@ def extract_domains(records: List[Dict]) -> List[str]:
         if website:
             href = website
         elif slug:
-            try:
-                href = _resolve_website_from_profile(slug)
-            except Exception:
+            href = resolved.get(slug)
+            if isinstance(href, Exception):
                 href = None
 
         if not href:
@@ -180,21 +294,11 @@ def extract_domains(records: List[Dict]) -> List[str]:
     return domains
 
 
-def fetch_all_records(feed_urls: List[str]) -> List[Dict]:
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=3)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
+async def fetch_all_records(feed_urls: List[str]) -> List[Dict]:
     records: List[Dict] = []
     for u in feed_urls:
-        r = session.get(u, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        data = r.json() if r.headers.get("content-type", "").startswith("application/json") else json.loads(r.text)
-        if isinstance(data, dict) and "results" in data:
-            records.extend(data.get("results", []) or [])
-        elif isinstance(data, list):
-            records.extend(data)
-    return records
+        records.extend(await fetch_feed(u))
+    return _dedupe(records)
 
 
 def _extract_from_record(rec: Dict) -> Tuple[Optional[str], Optional[str], Optional[str]]:
@@ -215,28 +319,33 @@ def _default_partnerpage_feed_urls() -> List[str]:
     return _default_feed_urls()
 
 
-def scrape_directory_json(feed_urls: Optional[List[str]] = None) -> Dict:
+async def scrape_directory_json(feed_urls: Optional[List[str]] = None) -> Dict:
     urls = feed_urls or _default_partnerpage_feed_urls()
-    records = fetch_all_records(urls)
+    records = await fetch_all_records(urls)
 
     name_map: Dict[str, str] = {}
     missing: List[Dict] = []
     domains: List[str] = []
     seen = set()
 
-    for rec in records:
-        name, website, slug = _extract_from_record(rec)
+    extracted = [_extract_from_record(rec) for rec in records]
+    resolved = await _resolve_profiles([slug for _, website, slug in extracted if slug and not website])
+
+    for name, website, slug in extracted:
         href: Optional[str] = None
+        error: Optional[Exception] = None
         if website:
             href = website
         elif slug:
-            try:
-                href = _resolve_website_from_profile(slug)
-            except Exception:
-                href = None
+            href = resolved.get(slug)
+            if isinstance(href, Exception):
+                href, error = None, href
 
         if not href:
-            missing.append({"name": name or "", "slug": slug or ""})
+            entry = {"name": name or "", "slug": slug or ""}
+            if error is not None:
+                entry["error"] = f"{type(error).__name__}: {str(error).splitlines()[0] if str(error) else ''}"
+            missing.append(entry)
             continue
 
         domain = _norm_domain(href)
@@ -244,9 +353,8 @@ def scrape_directory_json(feed_urls: Optional[List[str]] = None) -> Dict:
             missing.append({"name": name or "", "slug": slug or ""})
             continue
 
-        # Canonicalize alternates by reusing extract_domains for a single pseudo-record
-        normalized = extract_domains([{ "slug": slug or "", "website": href }])
-        domain = normalized[0] if normalized else domain
+        # Canonicalize alternate domains
+        domain = CANONICAL_DOMAIN_MAP.get(domain, domain)
 
         if domain in seen:
             continue
@@ -266,3 +374,6 @@ def scrape_directory_json(feed_urls: Optional[List[str]] = None) -> Dict:
         "source_pages": len(records),
     }
 
+
+def scrape_directory_json_sync(feed_urls: Optional[List[str]] = None) -> Dict:
+    return http_client.run_sync(scrape_directory_json(feed_urls))
@@ -1,39 +1,61 @@
-from typing import List, Tuple, Dict
-import re
-import requests
-from bs4 import BeautifulSoup
-
+import asyncio
+import hashlib
+import os
+from typing import List, Optional, Tuple, Dict
+
+from . import cpu, http_client, metrics
+from .discover import discover_pages
+from .fingerprint import FINGERPRINT_CHARS, Fingerprint, SeenPages, fingerprint
+from .html_parse import visible_text
 from .scrape_directory import HEADERS
-from .score import score_signals
+from .score import Rules, get_rules, score_signals
+
+# Visible text kept per page for scoring
+PAGE_TEXT_CHARS = int(os.getenv("PAGE_TEXT_CHARS", "800"))
+# Copies in a row after which a site is taken to serve one shell for every path
+SHELL_REPEATS = int(os.getenv("SHELL_REPEATS", "2"))
+
+
+async def fetch(url: str) -> str:
+    return await http_client.get_text(url, headers=HEADERS, max_chars=500_000)
 
 
-def _session_with_retries() -> requests.Session:
-    s = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=3)
-    s.mount("http://", adapter)
-    s.mount("https://", adapter)
-    return s
+def extract_visible_text(html: str, max_chars: Optional[int] = None) -> str:
+    return visible_text(html, max_chars)
 
 
-def fetch(url: str, session: requests.Session) -> str:
-    r = session.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    text = r.text
-    if len(text) > 500_000:
-        text = text[:500_000]
-    return text
+async def _fetch_html(url: str) -> str:
+    try:
+        with metrics.timed("page_fetch"):
+            return await fetch(url)
+    except Exception as e:
+        metrics.error("page_fetch", metrics.host_of(url), e)
+        return ""
 
 
-def extract_visible_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript", "svg"]):
-        tag.decompose()
-    text = soup.get_text(" ")
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+PageText = Tuple[str, Optional[Fingerprint]]
+
+
+def extract_texts(pages: List[str], max_chars: int) -> List[Optional[PageText]]:
+    """``(text, fingerprint)`` of each page, for scoring and duplicate checks (CPU pool job).
+
+    Empty pages give ``("", None)``, unparsable ones None. The fingerprint
+    covers ``FINGERPRINT_CHARS`` of text, more than is scored, so pages that
+    open with the same long menu are not taken for copies.
+    """
+    out: List[Optional[PageText]] = []
+    for html in pages:
+        try:
+            text = extract_visible_text(html, max(max_chars, FINGERPRINT_CHARS)) if html else ""
+        except Exception:
+            out.append(None)
+            continue
+        out.append((text[:max_chars], fingerprint(text) if text else None))
+    return out
 
 
 def _candidate_paths() -> List[List[str]]:
+    # Guessed sections, for sites whose links and sitemaps give nothing to go on
     return [
         ["/"],
         ["/about"],
@@ -44,31 +66,81 @@ def _candidate_paths() -> List[List[str]]:
     ]
 
 
-def scrape_partner(domain: str, limit_pages: int = 6) -> Dict:
-    session = _session_with_retries()
+async def collect_partner_pages(domain: str, limit_pages: int = 6, per_host: int = 1) -> Dict:
+    """Fetch up to ``limit_pages`` distinct pages of ``domain``.
+
+    The homepage comes first; the other pages are the most relevant ones
+    found by ``discover_pages``, or the guessed ``_candidate_paths`` when
+    discovery finds none. They are fetched in windows of ``per_host``
+    concurrent requests; sources are still taken in candidate order, so the
+    result does not depend on which request finished first.
+
+    A page whose text copies one already kept (exact or SimHash match) is
+    dropped and listed under ``duplicates``. After ``SHELL_REPEATS`` copies
+    in a row the site is taken to serve one shell for every path, and
+    fetching stops (``shell`` is set).
+
+    Returns ``{"sources", "text", "duplicates", "shell"}``.
+    """
     sources: List[str] = []
     text_blobs: List[str] = []
-
-    for group in _candidate_paths():
-        if len(sources) >= limit_pages:
-            break
-        for p in group:
+    duplicates: List[Dict] = []
+    seen = SeenPages()
+    repeats = 0
+    per_host = max(1, per_host)
+
+    async def add(window: List[str], pages: List[str]) -> None:
+        nonlocal repeats
+        # Only the first PAGE_TEXT_CHARS are scored, so parsing stops early
+        with metrics.timed("parse"):
+            results = await cpu.run(extract_texts, pages, PAGE_TEXT_CHARS)
+        for url, page in zip(window, results):
+            if page is None:
+                metrics.error("parse", metrics.host_of(url))
+                continue
             if len(sources) >= limit_pages:
                 break
-            url = f"https://{domain}{p}"
-            try:
-                html = fetch(url, session)
-                txt = extract_visible_text(html)
-            except Exception:
-                continue
+            txt, fp = page
             if not txt:
                 continue
-            text_blobs.append(txt[:800])
+            copy = seen.match(fp)
+            if copy is not None:
+                duplicates.append({"url": url, "duplicate_of": copy[0], "match": copy[1]})
+                metrics.duplicate_page(domain, copy[1])
+                repeats += 1
+                continue
+            repeats = 0
+            seen.add(url, fp)
+            text_blobs.append(txt)
             sources.append(url)
 
-    combined = "\n\n".join(text_blobs)
-    score = score_signals(combined)
+    home_url = f"https://{domain}/"
+    home = await _fetch_html(home_url)
+    await add([home_url], [home])
+    with metrics.timed("discover"):
+        urls = await discover_pages(domain, home_url, home, limit_pages - 1)
+    if not urls:
+        urls = [f"https://{domain}{p}" for group in _candidate_paths()[1:] for p in group]
+
+    shell = False
+    for i in range(0, len(urls), per_host):
+        if len(sources) >= limit_pages:
+            break
+        if repeats >= SHELL_REPEATS:
+            shell = True
+            break
+        window = urls[i:i + per_host]
+        await add(window, await asyncio.gather(*(_fetch_html(u) for u in window)))
+
+    return {"sources": sources, "text": "\n\n".join(text_blobs), "duplicates": duplicates, "shell": shell}
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
+
+def score_partner(domain: str, sources: List[str], combined: str, rules: Optional[Rules] = None) -> Dict:
+    score = score_signals(combined, rules)
     return {
         "domain": domain,
         "pages_scanned": len(sources),
@@ -76,6 +148,27 @@ def scrape_partner(domain: str, limit_pages: int = 6) -> Dict:
         "score_total": score["total"],
         "score_components": score["components"],
         "sources": sources,
+        "content_hash": content_hash(combined),
+        "rules_version": score["rules_version"],
     }
 
 
+async def score_partner_async(domain: str, sources: List[str], combined: str) -> Dict:
+    # Rules are passed explicitly so workers score with the parent's current set
+    with metrics.timed("score"):
+        return await cpu.run(score_partner, domain, sources, combined, get_rules())
+
+
+def with_page_report(result: Dict, pages: Dict) -> Dict:
+    """``result`` plus the duplicate pages ``collect_partner_pages`` dropped."""
+    return {**result, "duplicate_pages": pages["duplicates"], "shell": pages["shell"]}
+
+
+async def scrape_partner(domain: str, limit_pages: int = 6, per_host: int = 1) -> Dict:
+    pages = await collect_partner_pages(domain, limit_pages, per_host)
+    result = await score_partner_async(domain, pages["sources"], pages["text"])
+    return with_page_report(result, pages)
+
+
+def scrape_partner_sync(domain: str, limit_pages: int = 6, per_host: int = 1) -> Dict:
+    return http_client.run_sync(scrape_partner(domain, limit_pages, per_host))
@@ -1,16 +1,26 @@
 import os
 import json
-from typing import Dict
+from typing import Any, Dict, List, Optional, Sequence
 
 import gspread
 from google.oauth2.service_account import Credentials
 
+from . import metrics
+
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
 ]
 
+TABS = ("Enterprise", "MidMarket", "SMB")
+# Sheet columns; the score columns in between are the rules' categories
+LEAD_COLUMNS = ("timestamp", "name", "domain")
+TRAIL_COLUMNS = ("score_total", "tier", "sources")
+COLUMNS = LEAD_COLUMNS + ("size_signals", "enterprise_security", "tech_stack", "regulated_verticals",
+                          "delivery_maturity", "marketing_assets") + TRAIL_COLUMNS
+SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", "50"))
+
 
 def _gspread_client():
     raw = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
@@ -26,35 +36,97 @@ def _open_sheet(spreadsheet_id: str):
     return gc.open_by_key(spreadsheet_id)
 
 
-def ensure_tabs(sh, names=("Enterprise", "MidMarket", "SMB")):
-    existing = {ws.title for ws in sh.worksheets()}
+def ensure_tabs(sh, names=TABS) -> Dict[str, Any]:
+    """Create missing tabs and return ``{title: worksheet}`` for all of them."""
+    existing = {ws.title: ws for ws in sh.worksheets()}
     for n in names:
         if n not in existing:
-            sh.add_worksheet(title=n, rows=100, cols=20)
+            existing[n] = sh.add_worksheet(title=n, rows=100, cols=20)
+    return existing
 
 
-def append_row(sheet_name: str, row: Dict):
-    spreadsheet_id = os.getenv("SHEETS_SPREADSHEET_ID")
-    if not spreadsheet_id:
-        raise RuntimeError("SHEETS_SPREADSHEET_ID not set")
-    sh = _open_sheet(spreadsheet_id)
-    ensure_tabs(sh)
-    ws = sh.worksheet(sheet_name)
-    # Column order
-    values = [
-        row.get("timestamp", ""),
-        row.get("name", ""),
-        row.get("domain", ""),
-        row.get("size_signals", 0),
-        row.get("enterprise_security", 0),
-        row.get("tech_stack", 0),
-        row.get("regulated_verticals", 0),
-        row.get("delivery_maturity", 0),
-        row.get("marketing_assets", 0),
-        row.get("score_total", 0),
-        row.get("tier", ""),
-        row.get("sources", ""),
-    ]
-    ws.append_row(values, value_input_option="USER_ENTERED")
+_TEXT_COLUMNS = set(LEAD_COLUMNS) | {"tier", "sources"}
+
+
+def _row_values(row: Dict, columns: Sequence[str] = COLUMNS) -> List:
+    return [row.get(c, "" if c in _TEXT_COLUMNS else 0) for c in columns]
+
+
+class SheetWriter:
+    """Buffers rows per tab and writes each tab with one ``append_rows`` call.
+
+    The spreadsheet is opened (and ``tabs`` ensured) once, on first flush;
+    rows are written as ``columns``. ``client`` can be any object with
+    gspread's ``open_by_key`` interface; by default one is authorized from
+    ``GOOGLE_SERVICE_ACCOUNT_JSON``.
+    """
 
+    def __init__(self, spreadsheet_id: Optional[str] = None, client=None,
+                 batch_size: int = SHEETS_BATCH_SIZE,
+                 tabs: Sequence[str] = TABS, columns: Sequence[str] = COLUMNS) -> None:
+        self.spreadsheet_id = spreadsheet_id or os.getenv("SHEETS_SPREADSHEET_ID")
+        if not self.spreadsheet_id:
+            raise RuntimeError("SHEETS_SPREADSHEET_ID not set")
+        self.batch_size = max(1, batch_size)
+        self.tabs = tuple(tabs)
+        self.columns = tuple(columns)
+        self.rows_written = 0
+        self._client = client
+        self._sh = None
+        self._worksheets: Dict[str, Any] = {}
+        self._buffers: Dict[str, List[Dict]] = {}
 
+    def _worksheet(self, sheet_name: str):
+        if self._sh is None:
+            client = self._client or _gspread_client()
+            self._sh = client.open_by_key(self.spreadsheet_id)
+            self._worksheets = ensure_tabs(self._sh, names=self.tabs)
+        if sheet_name not in self._worksheets:
+            self._worksheets.update(ensure_tabs(self._sh, names=(sheet_name,)))
+        return self._worksheets[sheet_name]
+
+    def add(self, sheet_name: str, row: Dict) -> None:
+        buf = self._buffers.setdefault(sheet_name, [])
+        buf.append(row)
+        if len(buf) >= self.batch_size:
+            self.flush_tab(sheet_name)
+
+    def flush_tab(self, sheet_name: str) -> None:
+        rows = self._buffers.pop(sheet_name, [])
+        if not rows:
+            return
+        try:
+            with metrics.timed("sheet_write"):
+                self._worksheet(sheet_name).append_rows([_row_values(r, self.columns) for r in rows],
+                                                        value_input_option="USER_ENTERED")
+        except Exception:
+            # Keep the rows so a later flush can retry them
+            self._buffers[sheet_name] = rows + self._buffers.get(sheet_name, [])
+            raise
+        self.rows_written += len(rows)
+
+    def flush(self) -> None:
+        """Flush every tab; a failing tab keeps its rows and does not stop the others."""
+        errors = []
+        for sheet_name in list(self._buffers):
+            try:
+                self.flush_tab(sheet_name)
+            except Exception as e:
+                errors.append((sheet_name, e))
+        if len(errors) == 1:
+            raise errors[0][1]
+        if errors:
+            detail = "; ".join(f"{name}: {type(e).__name__}: {e}" for name, e in errors)
+            raise RuntimeError(f"Sheets flush failed for {len(errors)} tabs ({detail})") from errors[0][1]
+
+    def pending(self) -> int:
+        return sum(len(b) for b in self._buffers.values())
+
+    def pending_rows(self) -> List[Dict]:
+        """Rows added but not yet written (including ones kept after a failed flush)."""
+        return [row for rows in self._buffers.values() for row in rows]
+
+
+def append_row(sheet_name: str, row: Dict):
+    writer = SheetWriter(batch_size=1)
+    writer.add(sheet_name, row)
@@ -0,0 +1,136 @@
+"""Per-partner state kept between /process runs.
+
+For each domain we remember the hash of the text that was scored and the
+resulting score, so an incremental run can skip partners whose content has
+not changed since they were last written to the sheet. A new score is
+stored unwritten; ``mark_written`` flips it once its row has reached the
+sheet, so a failed write is retried by the next run. The text itself is
+kept too, so new scoring rules can be re-applied without fetching, along
+with the partner list of the latest directory scrape to limit that to
+current partners.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+
+STATE_PATH = os.getenv("STATE_PATH", ".cache/state.sqlite")          # empty disables state
+STATE_MAX_AGE_S = float(os.getenv("STATE_MAX_AGE_S", str(7 * 86400)))  # re-score at least this often
+
+
+class PartnerState(NamedTuple):
+    domain: str
+    content_hash: str
+    result: Dict
+    updated_at: float
+    text: Optional[str] = None
+    name: str = ""
+    written: bool = False  # row for this result has reached the sheet
+
+    def age(self) -> float:
+        return time.time() - self.updated_at
+
+
+class StateStore:
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS partners ("
+            " domain TEXT PRIMARY KEY, content_hash TEXT, result TEXT, updated_at REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS directory (domain TEXT PRIMARY KEY)")
+        for column in ("text TEXT", "name TEXT", "written INTEGER"):
+            try:
+                self._db.execute(f"ALTER TABLE partners ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # already there
+
+    _COLUMNS = "domain, content_hash, result, updated_at, text, name, written"
+
+    @staticmethod
+    def _state(row) -> PartnerState:
+        return PartnerState(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5] or "", bool(row[6]))
+
+    def get(self, domain: str) -> Optional[PartnerState]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM partners WHERE domain = ?", (domain,)
+            ).fetchone()
+        return self._state(row) if row is not None else None
+
+    # Partners in the latest directory scrape (all of them before the first one)
+    _LISTED = "(NOT EXISTS (SELECT 1 FROM directory) OR domain IN (SELECT domain FROM directory))"
+
+    def all(self, listed_only: bool = False, page_size: int = 200) -> Iterator[PartnerState]:
+        """Partners in domain order, read ``page_size`` rows at a time."""
+        where = f" AND {self._LISTED}" if listed_only else ""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT {self._COLUMNS} FROM partners WHERE domain > ?{where} ORDER BY domain LIMIT ?",
+                    (last, page_size),
+                ).fetchall()
+            for row in rows:
+                yield self._state(row)
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    def count(self, listed_only: bool = False, with_text: bool = False) -> int:
+        where = [self._LISTED] if listed_only else []
+        where += ["text IS NOT NULL"] if with_text else []
+        sql = "SELECT COUNT(*) FROM partners" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock:
+            return self._db.execute(sql).fetchone()[0]
+
+    def departed(self) -> List[str]:
+        """Known partners missing from the latest directory scrape."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT domain FROM partners WHERE NOT {self._LISTED} ORDER BY domain").fetchall()
+        return [r[0] for r in rows]
+
+    def put(self, domain: str, content_hash: str, result: Dict,
+            text: Optional[str] = None, name: str = "", written: bool = False,
+            updated_at: Optional[float] = None) -> None:
+        """Store a result; ``updated_at`` defaults to now (pass the old one when nothing was fetched)."""
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO partners ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (domain, content_hash, json.dumps(result), time.time() if updated_at is None else updated_at,
+                 text, name, int(written)),
+            )
+
+    def set_directory(self, domains: Iterable[str]) -> None:
+        """Remember the partners of the latest directory scrape."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM directory")
+            self._db.executemany("INSERT OR IGNORE INTO directory VALUES (?)", [(d,) for d in domains])
+            self._db.execute("COMMIT")
+
+    def mark_written(self, domains: Iterable[str]) -> None:
+        with self._lock:
+            self._db.executemany("UPDATE partners SET written = 1 WHERE domain = ?", [(d,) for d in domains])
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[StateStore]:
+    """The process-wide state store, or None when ``STATE_PATH`` is empty."""
+    global _store
+    if _store is None and STATE_PATH:
+        with _store_lock:
+            if _store is None:
+                _store = StateStore(STATE_PATH)
+    return _store
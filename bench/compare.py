@@ -0,0 +1,73 @@
+"""Diff two ``bench.pipeline`` result files.
+
+    python -m bench.compare bench/results/OLD.json bench/results/NEW.json [--threshold 10]
+
+Prints p50/p95 and throughput per stage with the relative change. Exits 1
+when a stage's p50 or p95 grew, or its throughput dropped, by more than
+``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def _fmt(change: Optional[float]) -> str:
+    return f"{change:+6.1f}%" if change is not None else "    n/a"
+
+
+def _settings(result: Dict) -> Dict:
+    args = {k: v for k, v in result["meta"].get("args", {}).items() if k != "out"}
+    return {**args, "cassette": result["meta"].get("cassette")}
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[str]:
+    """Print the table; return the stages that regressed."""
+    regressed = []
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for name, n in new["stages"].items():
+        o = old["stages"].get(name)
+        if name.startswith("_") or not n.get("count"):
+            continue
+        if not o or not o.get("count"):
+            print(f"  {name:<22} new stage")
+            continue
+        p50 = _change(o["p50_ms"], n["p50_ms"])
+        p95 = _change(o["p95_ms"], n["p95_ms"])
+        rate = _change(o["per_s"], n["per_s"])
+        worse = ((p50 or 0) > threshold or (p95 or 0) > threshold
+                 or (rate is not None and -rate > threshold))
+        if worse:
+            regressed.append(name)
+        print(f"  {name:<22} p50 {n['p50_ms']:9.2f} ms {_fmt(p50)}  p95 {n['p95_ms']:9.2f} ms {_fmt(p95)}"
+              f"  {n['per_s']:>10,.1f}/s {_fmt(rate)}{'  REGRESSED' if worse else ''}")
+    return regressed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10.0, help="percent change treated as a regression")
+    args = ap.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if _settings(old) != _settings(new):
+        print("warning: runs used different settings or fixtures")
+    regressed = compare(old, new, args.threshold)
+    if regressed:
+        print(f"regressed: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
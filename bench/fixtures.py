@@ -0,0 +1,176 @@
+"""Recorded HTTP traffic for the offline benchmarks.
+
+A cassette maps ``(method, url)`` to one recorded response. It is a JSON
+file, gzipped when the name ends in ``.gz``:
+
+    {"version": 1, "entries": [{"method", "url", "status", "headers", "body" | "body_b64"}]}
+
+``ReplayTransport`` serves a cassette to ``http_client`` (see
+``http_client.set_transport``), with an optional simulated network latency.
+Unknown URLs get a 404, like a partner site without that page.
+``RecordingTransport`` wraps the real network and captures every first
+response, so a live run can be saved and replayed later. Without a recorded
+cassette, ``make_cassette`` builds a deterministic synthetic one: a paginated
+directory feed, profile pages and partner sites (with menus, and sitemaps on
+about half of them).
+"""
+import asyncio
+import base64
+import gzip
+import json
+import random
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.scrape_directory import ALLOWLIST
+from app.scrape_directory_json import SITE_BASE, _default_feed_urls, _with_page
+from app.scrape_partner import _candidate_paths
+
+from .parse import make_page
+
+# Hop-by-hop or encoding headers that no longer describe the stored (decoded) body
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _key(method: str, url: str) -> Tuple[str, str]:
+    return method.upper(), str(httpx.URL(url))
+
+
+class Cassette:
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, str], Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, method: str, url: str, status: int, body: bytes,
+            headers: Optional[Dict[str, str]] = None) -> None:
+        headers = {k.lower(): v for k, v in (headers or {}).items() if k.lower() not in _DROP_HEADERS}
+        self.entries.setdefault(_key(method, url), {"status": status, "headers": headers, "body": body})
+
+    def add_html(self, url: str, html: str) -> None:
+        self.add("GET", url, 200, html.encode("utf-8"), {"content-type": "text/html; charset=utf-8"})
+
+    def add_json(self, url: str, data) -> None:
+        self.add("GET", url, 200, json.dumps(data).encode("utf-8"), {"content-type": "application/json"})
+
+    def get(self, method: str, url: str) -> Optional[Dict]:
+        return self.entries.get(_key(method, url))
+
+    def save(self, path: str) -> None:
+        entries = []
+        for (method, url), e in sorted(self.entries.items()):
+            item = {"method": method, "url": url, "status": e["status"], "headers": e["headers"]}
+            try:
+                item["body"] = e["body"].decode("utf-8")
+            except UnicodeDecodeError:
+                item["body_b64"] = base64.b64encode(e["body"]).decode("ascii")
+            entries.append(item)
+        data = json.dumps({"version": 1, "entries": entries}).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(gzip.compress(data) if path.endswith(".gz") else data)
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(".gz"):
+            data = gzip.decompress(data)
+        cassette = cls()
+        for item in json.loads(data)["entries"]:
+            body = (base64.b64decode(item["body_b64"]) if "body_b64" in item
+                    else item.get("body", "").encode("utf-8"))
+            cassette.add(item["method"], item["url"], item["status"], body, item.get("headers"))
+        return cassette
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves a cassette, sleeping ``latency_ms`` (+/- ``jitter``) per request."""
+
+    def __init__(self, cassette: Cassette, latency_ms: float = 0, jitter: float = 0.5, seed: int = 0) -> None:
+        self.cassette = cassette
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self._rnd = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.latency_ms > 0:
+            spread = 1 + self.jitter * (2 * self._rnd.random() - 1)
+            await asyncio.sleep(self.latency_ms * spread / 1000)
+        entry = self.cassette.get(request.method, str(request.url))
+        if entry is None:
+            self.misses += 1
+            return httpx.Response(404, request=request)
+        self.hits += 1
+        return httpx.Response(entry["status"], headers=entry["headers"], content=entry["body"], request=request)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards to the network and records each URL's first response."""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.cassette = cassette
+        self.inner = inner or httpx.AsyncHTTPTransport(retries=0)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        resp = await self.inner.handle_async_request(request)
+        body = await resp.aread()  # decoded per content-encoding
+        self.cassette.add(request.method, str(request.url), resp.status_code, body, dict(resp.headers))
+        headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in _DROP_HEADERS]
+        return httpx.Response(resp.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+# Share of partner sites that have each candidate path group (the home page always exists)
+_PATH_ODDS = [1.0, 0.8, 0.6, 0.5, 0.3, 0.3]
+_TLDS = ["com", "io", "ai", "co.uk", "de", "nl", "agency"]
+
+
+def make_cassette(partners: int = 60, page_kb: int = 40, page_size: int = 21, seed: int = 3) -> Cassette:
+    """A synthetic directory of ``partners`` profiles plus the allowlisted sites.
+
+    Profiles carry no website, so the directory stage resolves each one
+    through its profile page, as it does against the real feed.
+    """
+    rnd = random.Random(seed)
+    cassette = Cassette()
+    feed_url = _default_feed_urls()[0]
+
+    sites: List[str] = []
+    records = []
+    for i in range(partners):
+        domain = f"partner{i}.{rnd.choice(_TLDS)}"
+        slug = f"partner-{i}"
+        sites.append(domain)
+        records.append({"id": i + 1, "name": f"Partner {i}", "slug": slug})
+        profile = (f'<html><body><h1>Partner {i}</h1><a href="/">Directory</a>'
+                   f'<a href="https://www.linkedin.com/company/{slug}">LinkedIn</a>'
+                   f'<a href="https://{domain}/?utm_source=n8n">View website</a></body></html>')
+        cassette.add_html(f"{SITE_BASE}/{slug}", profile)
+
+    pages = max(1, -(-len(records) // page_size))
+    for page in range(1, pages + 1):
+        chunk = records[(page - 1) * page_size:page * page_size]
+        data = {"count": len(records), "results": chunk,
+                "next": _with_page(feed_url, page + 1) if page < pages else None}
+        cassette.add_json(feed_url if page == 1 else _with_page(feed_url, page), data)
+
+    for domain in sites + sorted(ALLOWLIST):
+        paths = [rnd.choice(group) for group, odds in zip(_candidate_paths()[1:], _PATH_ODDS[1:])
+                 if rnd.random() < odds]
+        # A typical menu: the real sections plus pages discovery should pass over
+        menu = [(p, p.strip("/").replace("-", " ").title()) for p in paths]
+        menu += [("/blog", "Blog"), ("/contact", "Contact"), ("/privacy-policy", "Privacy")]
+        cassette.add_html(f"https://{domain}/", make_page(page_kb, rnd.randrange(1 << 30), menu))
+        for path in paths:
+            cassette.add_html(f"https://{domain}{path}", make_page(page_kb, rnd.randrange(1 << 30), menu))
+        if rnd.random() < 0.5:
+            locs = "".join(f"<url><loc>https://{domain}{p}</loc></url>" for p in ["/"] + paths)
+            cassette.add("GET", f"https://{domain}/sitemap.xml", 200,
+                         f"<urlset>{locs}</urlset>".encode("utf-8"), {"content-type": "application/xml"})
+    return cassette
@@ -0,0 +1,91 @@
+"""Load test: concurrent /debug-render calls against a running server.
+
+    python -m bench.load_render http://localhost:8000 --url https://experts.n8n.io \\
+        [--requests 16] [--concurrency 8]
+
+While the renders run, /healthz is probed every 100 ms. With blocking
+endpoints each render holds a threadpool worker, so under load healthz
+latency climbs; with async endpoints it stays flat and render throughput
+is bounded only by ``RENDER_CONCURRENCY``.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _render(client: httpx.AsyncClient, sem: asyncio.Semaphore, url: str,
+                  wait_ms: int, latencies: List[float], errors: List[str]) -> None:
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            r = await client.get("/debug-render", params={"url": url, "wait_ms": wait_ms})
+            r.raise_for_status()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+            return
+        latencies.append(time.perf_counter() - t0)
+
+
+async def _probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            await client.get("/healthz")
+            latencies.append(time.perf_counter() - t0)
+        except httpx.HTTPError:
+            latencies.append(float("inf"))
+        await asyncio.sleep(0.1)
+
+
+async def run(base: str, url: str, requests: int, concurrency: int, wait_ms: int) -> None:
+    renders: List[float] = []
+    health: List[float] = []
+    errors: List[str] = []
+    sem = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=base, timeout=300) as client:
+        probe = asyncio.create_task(_probe(client, stop, health))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_render(client, sem, url, wait_ms, renders, errors)
+                               for _ in range(requests)))
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await probe
+
+    print(f"renders: {len(renders)} ok, {len(errors)} failed in {elapsed:.1f}s"
+          f"  ({len(renders) / elapsed:.2f} req/s)")
+    if renders:
+        print(f"  render latency p50 {_pct(renders, 0.5):.2f}s  p95 {_pct(renders, 0.95):.2f}s")
+    finite = [h for h in health if h != float("inf")]
+    if finite:
+        print(f"healthz: {len(health)} probes, {len(health) - len(finite)} failed"
+              f"  p50 {_pct(finite, 0.5) * 1000:.1f}ms  p95 {_pct(finite, 0.95) * 1000:.1f}ms"
+              f"  max {max(finite) * 1000:.1f}ms  mean {statistics.mean(finite) * 1000:.1f}ms")
+    for e in errors[:5]:
+        print(f"  error: {e}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base", help="server base URL, e.g. http://localhost:8000")
+    ap.add_argument("--url", default="https://experts.n8n.io", help="page to render")
+    ap.add_argument("--requests", type=int, default=16)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--wait-ms", type=int, default=1500)
+    args = ap.parse_args()
+    asyncio.run(run(args.base, args.url, args.requests, args.concurrency, args.wait_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: href -> partner domain normalisation over a synthetic corpus.
+
+    python -m bench.normalise [--hrefs 100000]
+
+The corpus mimics rendered directory pages: mostly links back to the
+directory and to a few hundred partner sites, plus social/tracker/CDN
+links and a long tail of one-off hosts. "baseline" is the previous
+``_norm_to_domain`` (suffix extraction on every href, then flat-set list
+checks on the registered domain) but using the offline extractor, so it
+never touches the network either.
+"""
+import argparse
+import random
+import time
+from typing import List, Optional
+
+from app.scrape_directory import (
+    ALLOWLIST, BLOCKLIST, _extract, _from_hrefs, _host, _host_to_domain, _norm_to_domain,
+)
+
+# The flat set the blocklist used to be, matched against registered domains only
+OLD_BLOCKLIST = {rule for rule in BLOCKLIST if not rule.startswith(("*", "=")) and not rule.endswith("*")}
+
+SUFFIXES = ["com", "io", "ai", "co.uk", "com.au", "de", "nl", "it", "co", "agency", "dev.br"]
+SUBDOMAINS = ["", "", "", "www.", "app.", "blog.", "docs.", "cdn.", "eu."]
+PATHS = ["/", "/about", "/services", "/case-studies/acme", "/contact?ref=n8n", "/blog/2024/automation"]
+
+
+def _baseline(url_or_host: str) -> Optional[str]:
+    h = _host(url_or_host)
+    if not h: return None
+    ext = _extract(h)
+    if not ext.domain or not ext.suffix: return None
+    domain = f"{ext.domain}.{ext.suffix}"
+    if domain in ALLOWLIST: return domain
+    if domain in OLD_BLOCKLIST: return None
+    return domain
+
+
+def make_corpus(n: int, seed: int = 11) -> List[str]:
+    rnd = random.Random(seed)
+    partners = [f"partner{i}.{rnd.choice(SUFFIXES)}" for i in range(400)] + sorted(ALLOWLIST)
+    blocked = sorted(OLD_BLOCKLIST)
+    hrefs = []
+    for i in range(n):
+        r = rnd.random()
+        if r < 0.35:
+            hrefs.append(f"https://experts.n8n.io/{rnd.choice(['', 'partner/', 'search?q='])}{i % 300}")
+        elif r < 0.70:
+            host = rnd.choice(SUBDOMAINS) + rnd.choice(partners)
+            hrefs.append(f"https://{host}{rnd.choice(PATHS)}")
+        elif r < 0.92:
+            host = rnd.choice(SUBDOMAINS) + rnd.choice(blocked)
+            hrefs.append(f"https://{host}/{rnd.choice(PATHS)}")
+        elif r < 0.97:
+            hrefs.append(f"https://site{i}.{rnd.choice(SUFFIXES)}/")  # long tail, never repeats
+        else:
+            hrefs.append(rnd.choice(["mailto:hello@acme.io", "tel:+4930123", "#top", "/relative/path"]))
+    return hrefs
+
+
+def _time(fn, hrefs: List[str]) -> float:
+    start = time.perf_counter()
+    for h in hrefs:
+        fn(h)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hrefs", type=int, default=100_000)
+    args = ap.parse_args()
+
+    hrefs = make_corpus(args.hrefs)
+    base = _time(_baseline, hrefs)
+    _host_to_domain.cache_clear()
+    cold = _time(_norm_to_domain, hrefs)
+    info = _host_to_domain.cache_info()
+    warm = _time(_norm_to_domain, hrefs)
+    start = time.perf_counter()
+    _from_hrefs(hrefs, "experts.n8n.io")
+    page = time.perf_counter() - start
+
+    rate = lambda s: f"{len(hrefs) / s:>10,.0f} hrefs/s"
+    print(f"{len(hrefs):,} hrefs, {info.currsize:,} distinct hosts")
+    print(f"  baseline        {base:6.2f}s  {rate(base)}")
+    print(f"  memoised, cold  {cold:6.2f}s  {rate(cold)}  x{base / cold:.1f}  (hits {info.hits:,}, misses {info.misses:,})")
+    print(f"  memoised, warm  {warm:6.2f}s  {rate(warm)}  x{base / warm:.1f}")
+    print(f"  _from_hrefs     {page:6.2f}s  {rate(page)}")
+
+    changed = [(h, _baseline(h), _norm_to_domain(h)) for h in hrefs if _baseline(h) != _norm_to_domain(h)]
+    print(f"  results differing from baseline: {len(changed)}")
+    for h, old, new in changed[:5]:
+        print(f"    {h}: {old} -> {new}")
+
+
+if __name__ == "__main__":
+    main()
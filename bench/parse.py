@@ -0,0 +1,86 @@
+"""Benchmark: HTML parsing throughput per ``html_parse`` backend.
+
+    python -m bench.parse [--kb 500] [--pages 20]
+
+Synthetic partner pages (head with inline scripts/styles, nav, long body,
+footer links) are parsed with every installed backend. It reports pages/s
+for scoring text (budgeted at ``PAGE_TEXT_CHARS``), full visible text and
+link extraction, next to the previous BeautifulSoup get_text path.
+"""
+import argparse
+import random
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from app.html_parse import available_backends, get_backend
+from app.scrape_partner import PAGE_TEXT_CHARS
+
+WORDS = (
+    "automation workflow n8n integration consulting enterprise onboarding "
+    "security soc2 gdpr crm erp pipeline support migration partner &amp; team"
+).split()
+
+
+def make_page(kb: int, seed: int, nav: Optional[List[Tuple[str, str]]] = None) -> str:
+    """A page of about ``kb`` KB; ``nav`` replaces the default ``(href, text)`` menu."""
+    rnd = random.Random(seed)
+    head = ("<head><title>Acme Automation</title>"
+            + "<script>" + "var x = 1;" * 2000 + "</script>"
+            + "<style>" + ".c{color:red}" * 1000 + "</style></head>")
+    links = nav if nav is not None else [(f"/p{i}", f"Page {i}") for i in range(40)]
+    nav_html = "<nav>" + "".join(f'<a href="{href}">{text}</a>' for href, text in links) + "</nav>"
+    blocks = []
+    size = 0
+    while size < kb * 1024:
+        words = " ".join(rnd.choice(WORDS) for _ in range(60))
+        block = (f'<section class="s{size}"><h2>{rnd.choice(WORDS)}</h2><p>{words} '
+                 f'<a href="https://site{rnd.randint(0, 99)}.com/x">link</a></p>'
+                 f'<svg viewBox="0 0 10 10"><path d="M0 0L10 10"/></svg></section>\n')
+        blocks.append(block)
+        size += len(block)
+    footer = '<footer><a href="https://linkedin.com/company/acme">LinkedIn</a><noscript>enable js</noscript></footer>'
+    return f"<!doctype html><html>{head}<body>{nav_html}{''.join(blocks)}{footer}</body></html>"
+
+
+def _old_text(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "svg"]):
+        tag.decompose()
+    return re.sub(r"\s+", " ", soup.get_text(" ")).strip()
+
+
+def _rate(fn: Callable[[str], object], pages: List[str]) -> float:
+    start = time.perf_counter()
+    for page in pages:
+        fn(page)
+    return len(pages) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--kb", type=int, default=500)
+    ap.add_argument("--pages", type=int, default=20)
+    args = ap.parse_args()
+
+    pages = [make_page(args.kb, seed) for seed in range(args.pages)]
+    print(f"{len(pages)} pages of ~{args.kb} KB, scoring budget {PAGE_TEXT_CHARS} chars")
+    old_pages = max(1, len(pages) // 4)
+    old = _rate(_old_text, pages[:old_pages])
+    print(f"  {'bs4 get_text (old)':<20} full text {old:8.1f} pages/s")
+    reference = _old_text(pages[0])
+
+    for name in available_backends():
+        b = get_backend(name)
+        budget = _rate(lambda h: b.visible_text(h, PAGE_TEXT_CHARS), pages)
+        full = _rate(lambda h: b.visible_text(h), pages)
+        links = _rate(lambda h: list(b.iter_links(h)), pages)
+        same = b.visible_text(pages[0]) == reference
+        print(f"  {name:<20} budgeted {budget:8.1f} pages/s  full text {full:8.1f} pages/s"
+              f"  links {links:8.1f} pages/s  matches old text: {same}")
+
+
+if __name__ == "__main__":
+    main()
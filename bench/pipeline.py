@@ -0,0 +1,223 @@
+"""Benchmark: every pipeline stage and ``process_all`` end to end, offline.
+
+    python -m bench.pipeline [--partners 60] [--page-kb 40] [--latency-ms 15] [--repeat 3]
+    python -m bench.pipeline --cassette bench/cassettes/live.json.gz
+    python -m bench.pipeline --record bench/cassettes/live.json.gz   # needs the network
+
+HTTP is replayed from a cassette (``bench.fixtures``): a recorded one, or by
+default a synthetic directory of ``--partners`` profiles and their sites.
+For each stage it reports calls/s and p50/p95/max latency; ``process_all``
+also carries its own per-stage metrics. Results are written as JSON (by
+default ``bench/results/<commit>.json``); diff two runs with
+``python -m bench.compare``.
+
+The HTTP cache, partner state, Sheets and per-host rate limiting are
+disabled, so every run does the same work and only the code under test sets
+the pace.
+"""
+import os
+
+# Before the app modules read them
+os.environ["HTTP_CACHE_PATH"] = ""
+os.environ["STATE_PATH"] = ""
+os.environ["RATE_LIMIT_RPS"] = "0"
+os.environ.pop("SHEETS_SPREADSHEET_ID", None)
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from app import cpu, http_client
+from app.html_parse import backend_name
+from app.process import PROCESS_CONCURRENCY, process_all_async
+from app.scrape_directory import _from_hrefs
+from app.scrape_directory_json import _default_feed_urls, extract_domains, fetch_all_records
+from app.scrape_partner import PAGE_TEXT_CHARS, extract_visible_text, scrape_partner
+from app.score import score_signals
+
+from .fixtures import Cassette, RecordingTransport, ReplayTransport, make_cassette
+from .normalise import make_corpus
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class Stage:
+    """Latency samples of one stage plus the wall time they took together."""
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.wall = 0.0
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    @contextmanager
+    def run(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall += time.perf_counter() - start
+
+    def summary(self) -> Dict:
+        ordered = sorted(self.samples)
+        n = len(ordered)
+        if not n:
+            return {"count": 0}
+        wall = self.wall or sum(ordered)
+        return {
+            "count": n,
+            "wall_s": round(wall, 4),
+            "per_s": round(n / wall, 2) if wall else None,
+            "p50_ms": round(ordered[(n - 1) // 2] * 1000, 3),
+            "p95_ms": round(ordered[min(n - 1, int(n * 0.95))] * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{sha}-dirty" if dirty else sha
+
+
+async def _record(path: str) -> None:
+    cassette = Cassette()
+    http_client.set_transport(RecordingTransport(cassette))
+    summary = await process_all_async()
+    cassette.save(path)
+    print(f"recorded {len(cassette)} responses for {summary.get('total', 0)} partners to {path}")
+
+
+async def _suite(cassette: Cassette, args) -> Dict[str, Dict]:
+    transport = ReplayTransport(cassette, latency_ms=args.latency_ms)
+    http_client.set_transport(transport)
+    stages: Dict[str, Stage] = {}
+
+    def stage(name: str) -> Stage:
+        return stages.setdefault(name, Stage())
+
+    feed_urls = _default_feed_urls()
+    records: List[Dict] = []
+    for _ in range(args.repeat):
+        with stage("fetch_all_records").call():
+            records = await fetch_all_records(feed_urls)
+
+    domains: List[str] = []
+    for _ in range(args.repeat):
+        with stage("extract_domains").call():
+            domains = await extract_domains(records)
+
+    hrefs = make_corpus(args.hrefs)
+    for i in range(0, len(hrefs), 500):
+        with stage("from_hrefs").call():
+            _from_hrefs(hrefs[i:i + 500], "experts.n8n.io")
+
+    # Partners concurrently, as the pipeline runs them
+    sem = asyncio.Semaphore(PROCESS_CONCURRENCY)
+
+    async def one(domain: str) -> None:
+        async with sem:
+            with stage("scrape_partner").call():
+                await scrape_partner(domain)
+
+    with stage("scrape_partner").run():
+        await asyncio.gather(*(one(d) for d in domains))
+
+    pages = [e["body"].decode("utf-8", "replace") for (method, url), e in sorted(cassette.entries.items())
+             if e["headers"].get("content-type", "").startswith("text/html")]
+    texts = []
+    for html in pages:
+        with stage("extract_visible_text").call():
+            texts.append(extract_visible_text(html, PAGE_TEXT_CHARS))
+    combined = ["\n\n".join(texts[i:i + 6]) for i in range(0, len(texts), 6)]
+    for text in combined:
+        with stage("score_signals").call():
+            score_signals(text)
+
+    process_stages: Dict = {}
+    for _ in range(args.repeat):
+        with stage("process_all").call():
+            summary = await process_all_async()
+        process_stages = summary.get("metrics", {}).get("stages", {})
+
+    results = {name: s.summary() for name, s in stages.items()}
+    results["process_all"]["partners"] = len(domains)
+    results["process_all"]["stages"] = process_stages
+    results["_replay"] = {"hits": transport.hits, "misses": transport.misses}
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cassette", help="replay a recorded cassette instead of the synthetic one")
+    ap.add_argument("--record", metavar="PATH", help="run once against the network and save a cassette")
+    ap.add_argument("--partners", type=int, default=60)
+    ap.add_argument("--page-kb", type=int, default=40)
+    ap.add_argument("--latency-ms", type=float, default=15, help="simulated per-request latency")
+    ap.add_argument("--hrefs", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="results file (default bench/results/<commit>.json)")
+    args = ap.parse_args()
+
+    try:
+        if args.record:
+            http_client.run_sync(_record(args.record))
+            return
+        cassette = Cassette.load(args.cassette) if args.cassette else make_cassette(args.partners, args.page_kb)
+        stages = http_client.run_sync(_suite(cassette, args))
+    finally:
+        http_client.set_transport(None)
+        cpu.shutdown()
+
+    commit = _git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": cpu.available_cpus(),
+            "cpu_workers": cpu.worker_count(),
+            "html_parser": backend_name(),
+            "cassette": args.cassette or "synthetic",
+            "responses": len(cassette),
+            "args": vars(args),
+        },
+        "stages": stages,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{len(cassette)} responses, {args.latency_ms:g} ms simulated latency, parser {backend_name()}")
+    for name, s in stages.items():
+        if name.startswith("_") or not s.get("count"):
+            continue
+        print(f"  {name:<22} {s['count']:>6} calls  {s['per_s']:>10,.1f}/s"
+              f"  p50 {s['p50_ms']:9.2f} ms  p95 {s['p95_ms']:9.2f} ms")
+    for name, s in stages["process_all"]["stages"].items():
+        print(f"    process_all/{name:<14} {s['count']:>6} calls  p50 {s['p50_s'] * 1000:9.2f} ms"
+              f"  p95 {s['p95_s'] * 1000:9.2f} ms")
+    print(f"results: {out}")
+
+
+if __name__ == "__main__":
+    main()
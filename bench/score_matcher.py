@@ -0,0 +1,79 @@
+"""Micro-benchmark: compiled keyword matcher vs per-keyword substring scans.
+
+    python -m bench.score_matcher [--chars 4800] [--repeat 500]
+
+The "substring" path is the previous implementation of ``score_signals``:
+one ``kw in text`` scan per keyword, per category.
+"""
+import argparse
+import random
+import timeit
+from typing import Dict
+
+from app.score import get_rules, match_keywords, score_signals
+
+CATEGORIES = get_rules().categories
+
+
+FILLER = (
+    "we help teams automate workflows with n8n storage translate association "
+    "integration consulting platform data pipeline customer success delivery "
+    "strategy cloud migration onboarding training partners europe"
+).split()
+
+
+def _substring_score(text: str) -> Dict[str, int]:
+    t = text.lower()
+    out = {}
+    for name, cap, kws in CATEGORIES:
+        score = 0
+        for kw, pts in kws.items():
+            if kw in t:
+                score += pts
+        out[name] = min(score, cap)
+    return out
+
+
+def _compiled_score(text: str) -> Dict[str, int]:
+    return score_signals(text)["components"]
+
+
+def make_text(chars: int, seed: int = 7) -> str:
+    """Filler prose with a handful of keywords sprinkled in.
+
+    Like a real partner page, most keywords are absent, which is the
+    substring path's worst case (each miss is a full scan).
+    """
+    rnd = random.Random(seed)
+    keywords = sorted(kw for _, _, kws in CATEGORIES for kw in kws)
+    present = rnd.sample(keywords, 8)
+    words = []
+    size = 0
+    while size < chars:
+        w = rnd.choice(present) if rnd.random() < 0.005 else rnd.choice(FILLER)
+        words.append(w.capitalize() if rnd.random() < 0.1 else w)
+        size += len(w) + 1
+    return " ".join(words)[:chars]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chars", type=int, nargs="*", default=[4800, 48_000, 480_000])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    for chars in args.chars:
+        text = make_text(chars)
+        n = max(1, args.repeat * 4800 // chars)
+        old = min(timeit.repeat(lambda: _substring_score(text), number=n, repeat=3)) / n
+        new = min(timeit.repeat(lambda: _compiled_score(text), number=n, repeat=3)) / n
+        print(f"{chars:>8} chars  substring {old * 1e6:9.1f} us  compiled {new * 1e6:9.1f} us"
+              f"  speedup x{old / new:4.1f}")
+
+    sample = "Secure storage, translate services and association membership"
+    old_hits = sorted(kw for _, _, kws in CATEGORIES for kw in kws if kw in sample.lower())
+    print(f"false hits on {sample!r}: substring={old_hits} compiled={sorted(match_keywords(sample))}")
+
+
+if __name__ == "__main__":
+    main()
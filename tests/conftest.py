@@ -0,0 +1,6 @@
+import os
+
+# Before the app modules read them: no on-disk cache or state, no pacing
+os.environ["HTTP_CACHE_PATH"] = ""
+os.environ["STATE_PATH"] = ""
+os.environ["RATE_LIMIT_RPS"] = "0"
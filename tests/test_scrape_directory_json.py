@@ -0,0 +1,92 @@
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+
+from app import http_client
+from app.scrape_directory_json import _with_page, fetch_feed
+
+FEED = "https://admin.partnerpage.io/search/directory_vendor/service_partners/x/?page_size=21"
+
+
+class StubFeed:
+    """A DRF-style paginated feed: ``count``/``next``/``results``, 404 past the last page."""
+
+    def __init__(self, total, page_size=21, with_count=True):
+        self.records = [{"id": i, "slug": f"partner-{i}"} for i in range(1, total + 1)]
+        self.page_size = page_size
+        self.with_count = with_count
+        self.empty_pages = set()
+        self.after_first_page = None  # called once page 1 has been served
+        self.requested = []
+
+    def handler(self, request):
+        page = int(parse_qs(urlparse(str(request.url)).query).get("page", ["1"])[0])
+        self.requested.append(page)
+        pages = max(1, -(-len(self.records) // self.page_size))
+        if page > pages:
+            return httpx.Response(404, json={"detail": "Invalid page."})
+        results = [] if page in self.empty_pages else \
+            self.records[(page - 1) * self.page_size:page * self.page_size]
+        data = {"next": _with_page(FEED, page + 1) if page < pages else None, "results": results}
+        if self.with_count:
+            data["count"] = len(self.records)
+        if page == 1 and self.after_first_page:
+            self.after_first_page(self)
+        return httpx.Response(200, json=data)
+
+
+@pytest.fixture
+def serve():
+    def install(feed):
+        http_client.set_transport(httpx.MockTransport(feed.handler))
+        return feed
+    yield install
+    http_client.set_transport(None)
+
+
+def _ids(records):
+    return [r["id"] for r in records]
+
+
+def test_reads_every_page_from_count(serve):
+    feed = serve(StubFeed(50))
+    records = http_client.run_sync(fetch_feed(FEED))
+    assert _ids(records) == list(range(1, 51))
+    assert sorted(feed.requested) == [1, 2, 3]
+
+
+def test_follows_next_without_a_count(serve):
+    feed = serve(StubFeed(50, with_count=False))
+    records = http_client.run_sync(fetch_feed(FEED))
+    assert _ids(records) == list(range(1, 51))
+    assert feed.requested == [1, 2, 3]
+
+
+def test_directory_shrinking_after_the_first_page_keeps_fetched_records(serve):
+    feed = StubFeed(70)  # 4 pages at first
+
+    def shrink(f):
+        del f.records[30:]  # now only 2 pages: pages 3 and 4 answer 404
+
+    feed.after_first_page = shrink
+    serve(feed)
+    records = http_client.run_sync(fetch_feed(FEED))
+    assert _ids(records) == list(range(1, 31))
+
+
+def test_empty_page_ends_the_feed(serve):
+    feed = serve(StubFeed(63))
+    feed.empty_pages = {2}
+    records = http_client.run_sync(fetch_feed(FEED))
+    assert _ids(records) == list(range(1, 22))
+
+
+def test_other_errors_still_fail_the_scrape(serve):
+    class Forbidden(StubFeed):
+        def handler(self, request):
+            return httpx.Response(403) if "page=2" in str(request.url) else super().handler(request)
+
+    serve(Forbidden(50))
+    with pytest.raises(httpx.HTTPStatusError):
+        http_client.run_sync(fetch_feed(FEED))
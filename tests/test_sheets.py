@@ -0,0 +1,106 @@
+import pytest
+
+from app.sheets import SheetWriter
+
+
+class FakeWorksheet:
+    def __init__(self, title, fail=False):
+        self.title = title
+        self.fail = fail
+        self.calls = []
+
+    def append_rows(self, rows, value_input_option=None):
+        if self.fail:
+            raise ConnectionError(f"{self.title} unavailable")
+        self.calls.append(rows)
+
+
+class FakeSpreadsheet:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.tabs = {}
+
+    def worksheets(self):
+        return list(self.tabs.values())
+
+    def add_worksheet(self, title, rows, cols):
+        ws = self.tabs[title] = FakeWorksheet(title, fail=title in self.failing)
+        return ws
+
+
+class FakeClient:
+    def __init__(self, failing=()):
+        self.sheet = FakeSpreadsheet(failing)
+
+    def open_by_key(self, key):
+        return self.sheet
+
+
+def _row(domain, tier="SMB"):
+    return {"domain": domain, "tier": tier, "score_total": 1}
+
+
+def _domains(calls):
+    return [[values[2] for values in rows] for rows in calls]
+
+
+def test_flushes_a_tab_when_its_batch_is_full():
+    client = FakeClient()
+    writer = SheetWriter("sheet-id", client=client, batch_size=2)
+    for d in ("a.com", "b.com", "c.com"):
+        writer.add("SMB", _row(d))
+
+    assert _domains(client.sheet.tabs["SMB"].calls) == [["a.com", "b.com"]]
+    assert writer.pending() == 1
+    assert writer.rows_written == 2
+
+
+def test_final_flush_writes_every_tab_once():
+    client = FakeClient()
+    writer = SheetWriter("sheet-id", client=client, batch_size=50)
+    writer.add("SMB", _row("a.com"))
+    writer.add("Enterprise", _row("b.com", "Enterprise"))
+    writer.add("SMB", _row("c.com"))
+    assert client.sheet.tabs == {}  # nothing opened before the first flush
+
+    writer.flush()
+
+    assert _domains(client.sheet.tabs["SMB"].calls) == [["a.com", "c.com"]]
+    assert _domains(client.sheet.tabs["Enterprise"].calls) == [["b.com"]]
+    assert writer.pending() == 0
+    assert writer.rows_written == 3
+
+
+def test_failed_tab_keeps_its_rows_and_others_still_flush():
+    client = FakeClient(failing={"SMB"})
+    writer = SheetWriter("sheet-id", client=client, batch_size=50)
+    writer.add("SMB", _row("a.com"))
+    writer.add("Enterprise", _row("b.com", "Enterprise"))
+
+    with pytest.raises(ConnectionError):
+        writer.flush()
+
+    assert _domains(client.sheet.tabs["Enterprise"].calls) == [["b.com"]]
+    assert [r["domain"] for r in writer.pending_rows()] == ["a.com"]
+
+    # Rows added after the failure go out behind the retained ones
+    writer.add("SMB", _row("c.com"))
+    client.sheet.tabs["SMB"].fail = False
+    writer.flush()
+
+    assert _domains(client.sheet.tabs["SMB"].calls) == [["a.com", "c.com"]]
+    assert writer.pending() == 0
+
+
+def test_several_failing_tabs_are_reported_together():
+    client = FakeClient(failing={"SMB", "Enterprise"})
+    writer = SheetWriter("sheet-id", client=client)
+    writer.add("SMB", _row("a.com"))
+    writer.add("Enterprise", _row("b.com", "Enterprise"))
+    writer.add("MidMarket", _row("c.com", "Mid-market"))
+
+    with pytest.raises(RuntimeError, match="2 tabs"):
+        writer.flush()
+
+    assert _domains(client.sheet.tabs["MidMarket"].calls) == [["c.com"]]
+    assert writer.pending() == 2